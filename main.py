@@ -1,84 +1,863 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
 import threading
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import socket
 import xml.etree.ElementTree as ET
 import json
 import os
-import speech_recognition as sr
+import queue
+import sqlite3
+import asyncio
+import io
+import http.client
+import urllib.parse
+import argparse
+import subprocess
+import sys
+import heapq
+import datetime
+import importlib.util
+import re
+import difflib
+import random
+import tempfile
+import shutil
+import base64
+import math
+import struct
+import zlib
+import bisect
+import ipaddress
+import shlex
+from abc import ABC, abstractmethod
+from array import array
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import deque, Counter, OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+tk = ttk = messagebox = simpledialog = None
+sr = None
+def load_gui_modules():
+    global tk, ttk, messagebox, simpledialog
+    import tkinter as tk
+    from tkinter import ttk, messagebox, simpledialog
+def load_voice_modules():
+    global sr
+    import speech_recognition as sr
+class Histogram:
+    BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1] * 2
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+class MetricSpan:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.labels["outcome"] = "error"
+        self.metrics.observe(self.name, self.elapsed, **self.labels)
+        return False
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+    def span(self, name, **labels):
+        return MetricSpan(self, name, labels)
+    def incr(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+    def snapshot(self):
+        with self.lock:
+            return [(name, dict(labels), histogram.count, histogram.sum / histogram.count if histogram.count else 0.0,
+                     histogram.quantile(0.5), histogram.quantile(0.95), histogram.quantile(0.99))
+                    for (name, labels), histogram in sorted(self.histograms.items())]
+    def to_prometheus(self):
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{str(value)}"' for key, value in pairs) + "}"
+        lines = []
+        typed = set()
+        with self.lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+METRICS = Metrics()
+class StartupPhase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+class StartupProfiler:
+    def __init__(self, origin=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.phases = []
+        self.marks = {}
+        self.lock = threading.Lock()
+    def phase(self, name):
+        return StartupPhase(self, name)
+    def record(self, name, start, end):
+        with self.lock:
+            self.phases.append((name, start - self.origin, end - start))
+        METRICS.observe("roku_startup_phase_seconds", end - start, phase=name)
+    def mark(self, name):
+        elapsed = time.perf_counter() - self.origin
+        with self.lock:
+            self.marks.setdefault(name, elapsed)
+        METRICS.observe("roku_startup_seconds", elapsed, milestone=name)
+    def to_dict(self):
+        with self.lock:
+            return {"phases": {name: elapsed for name, _, elapsed in self.phases}, "marks": dict(self.marks)}
+def ecp_endpoint(path):
+    parts = path.strip("/").split("/")
+    if parts[0] == "query" and len(parts) > 1:
+        return f"query/{parts[1]}"
+    return parts[0]
+class AppInfo:
+    __slots__ = ('id', 'name', 'type', 'version')
+    def __init__(self, id, name, type=None, version=None):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.version = version
+    def __repr__(self):
+        return f"AppInfo({self.id!r}, {self.name!r}, {self.type!r}, {self.version!r})"
+    def __eq__(self, other):
+        return isinstance(other, AppInfo) and (self.id, self.name, self.type, self.version) == (other.id, other.name, other.type, other.version)
+    def __hash__(self):
+        return hash((self.id, self.name, self.type, self.version))
+    def to_dict(self):
+        return {"id": self.id, "name": self.name, "type": self.type, "version": self.version}
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, (list, tuple)):
+            return cls(*data)
+        return cls(data.get("id"), data.get("name"), data.get("type"), data.get("version"))
+class DeviceInfo:
+    FIELDS = {
+        'udn': 'udn',
+        'serial-number': 'serial_number',
+        'device-id': 'device_id',
+        'vendor-name': 'vendor_name',
+        'model-name': 'model_name',
+        'model-number': 'model_number',
+        'friendly-device-name': 'friendly_device_name',
+        'user-device-name': 'user_device_name',
+        'software-version': 'software_version',
+        'software-build': 'software_build',
+        'network-type': 'network_type',
+        'network-name': 'network_name',
+        'ethernet-mac': 'ethernet_mac',
+        'wifi-mac': 'wifi_mac',
+        'screen-size': 'screen_size',
+        'power-mode': 'power_mode',
+        'uptime': 'uptime',
+        'is-tv': 'is_tv',
+        'supports-wake-on-wlan': 'supports_wake_on_wlan'
+    }
+    TYPED = frozenset(('uptime', 'is_tv', 'supports_wake_on_wlan'))
+    __slots__ = tuple(FIELDS.values()) + ('extra',)
+    def __init__(self):
+        for attr in self.FIELDS.values():
+            setattr(self, attr, None)
+        self.extra = {}
+    def set(self, tag, text):
+        attr = self.FIELDS.get(tag)
+        if attr is None:
+            self.extra[tag] = text
+        elif attr == 'uptime':
+            self.uptime = int(text) if text and text.isdigit() else None
+        elif attr in ('is_tv', 'supports_wake_on_wlan'):
+            setattr(self, attr, text == 'true' if text is not None else None)
+        else:
+            setattr(self, attr, text)
+    def get(self, tag, default=None):
+        attr = self.FIELDS.get(tag)
+        value = getattr(self, attr) if attr else self.extra.get(tag)
+        return default if value is None else value
+    def __bool__(self):
+        return any(getattr(self, attr) is not None for attr in self.FIELDS.values()) or bool(self.extra)
+    def to_dict(self):
+        data = {tag: getattr(self, attr) for tag, attr in self.FIELDS.items() if getattr(self, attr) is not None}
+        data.update(self.extra)
+        return data
+    @classmethod
+    def from_dict(cls, data):
+        info = cls()
+        for tag, value in data.items():
+            if isinstance(value, bool):
+                value = 'true' if value else 'false'
+            info.set(tag, value if value is None else str(value))
+        return info
+APP_LIST_CACHE = OrderedDict()
+APP_LIST_CACHE_SIZE = 8
+def parse_app_list(data):
+    cached = APP_LIST_CACHE.get(data)
+    if cached is not None:
+        return list(cached)
+    apps = []
+    types = {}
+    for app in ET.fromstring(data).iter('app'):
+        app_type = app.get('type')
+        apps.append(AppInfo(app.get('id'), app.text, types.setdefault(app_type, app_type), app.get('version')))
+    APP_LIST_CACHE[data] = tuple(apps)
+    while len(APP_LIST_CACHE) > APP_LIST_CACHE_SIZE:
+        APP_LIST_CACHE.popitem(last=False)
+    return apps
+def parse_device_info(data):
+    info = DeviceInfo()
+    fields = DeviceInfo.FIELDS
+    typed = DeviceInfo.TYPED
+    for elem in ET.fromstring(data):
+        attr = fields.get(elem.tag)
+        if attr is None or attr in typed:
+            info.set(elem.tag, elem.text)
+        else:
+            setattr(info, attr, elem.text)
+    return info
+def timed_parse(document, parse, data):
+    start = time.perf_counter()
+    result = parse(data)
+    METRICS.observe("roku_xml_parse_seconds", time.perf_counter() - start, document=document)
+    return result
+def parse_active_app(data):
+    apps = parse_app_list(data)
+    return apps[0] if apps else None
+def parse_media_player(data):
+    root = ET.fromstring(data)
+    plugin = root.find('plugin')
+    state = {'state': root.get('state'), 'error': root.get('error') == 'true', 'app': plugin.get('name') if plugin is not None else None}
+    for tag in ('position', 'duration'):
+        value = root.findtext(tag)
+        state[tag] = int(value.split()[0]) if value else None
+    return state
+ECP_PORT = 8060
+def split_host_port(address, port=None):
+    if address and address.count(":") == 1:
+        host, value = address.split(":")
+        return host, int(value)
+    return address, port or ECP_PORT
+def join_host_port(host, port):
+    return host if port == ECP_PORT else f"{host}:{port}"
+SSDP_ADDRESS = ('239.255.255.250', 1900)
+def ssdp_search_request(mx=3, st='roku:ecp'):
+    return (
+        'M-SEARCH * HTTP/1.1\r\n' +
+        'HOST: 239.255.255.250:1900\r\n' +
+        'MAN: "ssdp:discover"\r\n' +
+        f'ST: {st}\r\n' +
+        f'MX: {mx}\r\n\r\n'
+    )
+class RokuDevice:
+    def __init__(self, ip_address, location=None, usn=None, serial_number=None, server=None):
+        self.ip_address = ip_address
+        self.location = location or f"http://{ip_address}:{ECP_PORT}/"
+        self.usn = usn
+        self.serial_number = serial_number
+        self.server = server
+    @property
+    def key(self):
+        return self.serial_number or self.usn or self.ip_address
+    @property
+    def port(self):
+        return urllib.parse.urlsplit(self.location).port or ECP_PORT
+    def to_dict(self):
+        return {
+            "ip_address": self.ip_address,
+            "location": self.location,
+            "usn": self.usn,
+            "serial_number": self.serial_number,
+            "server": self.server
+        }
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["ip_address"], data.get("location"), data.get("usn"), data.get("serial_number"), data.get("server"))
+    def __repr__(self):
+        return f"RokuDevice({self.ip_address!r}, serial_number={self.serial_number!r})"
+def parse_ssdp_response(data, addr=None):
+    status_line, _, header_block = data.partition(b'\r\n')
+    headers = http.client.parse_headers(io.BytesIO(header_block))
+    location = headers.get('location')
+    if not location:
+        return None
+    ip = urllib.parse.urlsplit(location).hostname or (addr[0] if addr else None)
+    usn = headers.get('usn')
+    serial = None
+    if usn and usn.lower().startswith('uuid:roku:ecp:'):
+        serial = usn.split(':', 3)[3].split('::')[0]
+    return RokuDevice(ip, location, usn, serial, headers.get('server'))
+def iter_discover(timeout=None, mx=3, address=SSDP_ADDRESS):
+    if timeout is None:
+        timeout = mx + 1
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    seen = set()
+    start = time.perf_counter()
+    try:
+        sock.sendto(ssdp_search_request(mx).encode(), address)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                data, addr = sock.recvfrom(65507)
+            except socket.timeout:
+                break
+            device = parse_ssdp_response(data, addr)
+            if device is None or device.key in seen:
+                continue
+            seen.add(device.key)
+            METRICS.observe("roku_discovery_response_seconds", time.perf_counter() - start, transport="ssdp")
+            yield device
+    finally:
+        sock.close()
+        METRICS.observe("roku_discovery_seconds", time.perf_counter() - start, transport="ssdp", found="true" if seen else "false")
+def discover_devices(timeout=None, mx=3, callback=None, address=SSDP_ADDRESS):
+    devices = []
+    try:
+        for device in iter_discover(timeout, mx, address):
+            devices.append(device)
+            if callback:
+                callback(device)
+    except OSError as e:
+        print(f"Error during device discovery: {e}")
+    return devices
+def local_networks(prefix=24):
+    addresses = set()
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(("10.255.255.255", 1))
+            addresses.add(sock.getsockname()[0])
+    except OSError:
+        pass
+    try:
+        addresses.update(socket.gethostbyname_ex(socket.gethostname())[2])
+    except OSError:
+        pass
+    networks = []
+    for address in addresses:
+        ip = ipaddress.ip_address(address)
+        if ip.is_loopback or ip.is_link_local:
+            continue
+        network = ipaddress.ip_network(f"{address}/{prefix}", strict=False)
+        if network not in networks:
+            networks.append(network)
+    return networks
+async def scan_networks_async(networks, port=ECP_PORT, concurrency=256, connect_timeout=0.5, read_timeout=2.0, callback=None, progress=None):
+    hosts = [str(host) for network in networks for host in network.hosts()]
+    semaphore = asyncio.Semaphore(concurrency)
+    devices = []
+    done = 0
+    async def probe(host):
+        nonlocal done
+        try:
+            async with semaphore:
+                try:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), connect_timeout)
+                except (OSError, asyncio.TimeoutError):
+                    return
+                try:
+                    writer.write((f"GET /query/device-info HTTP/1.1\r\n"
+                                  f"Host: {host}:{port}\r\n"
+                                  "Connection: close\r\n\r\n").encode())
+                    await writer.drain()
+                    status, body, _ = await asyncio.wait_for(AsyncRokuController.read_response(reader), read_timeout)
+                    info = timed_parse("device-info", parse_device_info, body) if status == 200 else DeviceInfo()
+                except (OSError, ValueError, IndexError, asyncio.TimeoutError, asyncio.IncompleteReadError, ET.ParseError):
+                    return
+                finally:
+                    writer.close()
+            if info.serial_number:
+                server = f"Roku/{info.software_version}" if info.software_version else None
+                device = RokuDevice(host, f"http://{host}:{port}/", f"uuid:roku:ecp:{info.serial_number}", info.serial_number, server)
+                devices.append(device)
+                if callback:
+                    callback(device)
+        finally:
+            done += 1
+            if progress:
+                progress(done, len(hosts))
+    await asyncio.gather(*(probe(host) for host in hosts))
+    return devices
+def scan_devices(networks=None, port=ECP_PORT, concurrency=256, connect_timeout=0.5, callback=None, progress=None, max_hosts=4096):
+    networks = [ipaddress.ip_network(network, strict=False) if isinstance(network, str) else network for network in (networks or local_networks())]
+    for network in [network for network in networks if network.num_addresses > max_hosts]:
+        print(f"Skipping {network}: more than {max_hosts} addresses")
+        networks.remove(network)
+    if not networks:
+        print("No local IPv4 networks to scan")
+        return []
+    print(f"Scanning {', '.join(str(network) for network in networks)} for Roku devices on port {port}...")
+    start = time.perf_counter()
+    devices = []
+    try:
+        devices = asyncio.run(scan_networks_async(networks, port, concurrency, connect_timeout, callback=callback, progress=progress))
+    except OSError as e:
+        print(f"Error during network scan: {e}")
+    METRICS.observe("roku_discovery_seconds", time.perf_counter() - start, transport="scan", found="true" if devices else "false")
+    return devices
+def read_http_response(fp):
+    status_line = fp.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed by Roku")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = fp.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    keep_alive = headers.get('connection', '').lower() != 'close'
+    if 'content-length' in headers:
+        body = fp.read(int(headers['content-length']))
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = b''
+        while True:
+            size = int(fp.readline().split(b';')[0], 16)
+            if size == 0:
+                fp.readline()
+                break
+            body += fp.read(size)
+            fp.readline()
+    else:
+        body = fp.read()
+        keep_alive = False
+    return status, body, keep_alive
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    pass
+class DeviceHealth:
+    def __init__(self, window=20, min_samples=5, failure_rate=0.5, consecutive_failures=3, slow_latency=2.0, open_timeout=2.0, max_open_timeout=60.0):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.failure_rate = failure_rate
+        self.consecutive_failures = consecutive_failures
+        self.slow_latency = slow_latency
+        self.open_timeout = open_timeout
+        self.max_open_timeout = max_open_timeout
+        self.current_timeout = open_timeout
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.consecutive = 0
+        self.probing = False
+        self.rejected = 0
+        self.probe = None
+        self.prober = None
+        self.listeners = []
+        self.lock = threading.Lock()
+    def allow(self):
+        with self.lock:
+            changed = None
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.current_timeout:
+                changed = self.state = "half-open"
+            if self.state == "closed":
+                allowed = True
+            elif self.state == "half-open" and not self.probing:
+                self.probing = allowed = True
+            else:
+                self.rejected += 1
+                allowed = False
+        self.notify(changed)
+        return allowed
+    def reject(self):
+        with self.lock:
+            self.rejected += 1
+    def record(self, ok, latency):
+        healthy = ok and latency < self.slow_latency
+        changed = None
+        with self.lock:
+            self.samples.append((healthy, latency))
+            self.consecutive = 0 if healthy else self.consecutive + 1
+            if self.state == "half-open":
+                self.probing = False
+                if healthy:
+                    self.samples.clear()
+                    self.current_timeout = self.open_timeout
+                    changed = self.state = "closed"
+                else:
+                    self.current_timeout = min(self.current_timeout * 2, self.max_open_timeout)
+                    changed = self.trip()
+            elif self.state == "closed" and not healthy:
+                failures = sum(1 for sample_ok, _ in self.samples if not sample_ok)
+                if self.consecutive >= self.consecutive_failures or (len(self.samples) >= self.min_samples and failures / len(self.samples) >= self.failure_rate):
+                    changed = self.trip()
+        self.notify(changed)
+    def trip(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        if self.prober is None and self.probe:
+            self.prober = threading.Thread(target=self.probe_loop, daemon=True)
+            self.prober.start()
+        return self.state
+    def probe_loop(self):
+        while True:
+            with self.lock:
+                if self.state == "closed" or self.probe is None:
+                    self.prober = None
+                    return
+                wait_time = self.opened_at + self.current_timeout - time.monotonic()
+            if wait_time > 0:
+                time.sleep(min(wait_time, 1.0))
+                continue
+            self.probe()
+            time.sleep(0.1)
+    def reset(self):
+        with self.lock:
+            changed = None if self.state == "closed" else "closed"
+            self.state = "closed"
+            self.probing = False
+            self.consecutive = 0
+            self.samples.clear()
+            self.current_timeout = self.open_timeout
+        self.notify(changed)
+    def retry_soon(self):
+        with self.lock:
+            self.current_timeout = self.open_timeout
+            if self.state == "open":
+                self.opened_at = time.monotonic() - self.open_timeout
+    def notify(self, state):
+        if state is None:
+            return
+        METRICS.incr("roku_circuit_transitions_total", state=state)
+        for listener in list(self.listeners):
+            listener(state)
+    def success_rate(self):
+        with self.lock:
+            samples = list(self.samples)
+        return sum(1 for ok, _ in samples if ok) / len(samples) if samples else 1.0
+    def summary(self):
+        with self.lock:
+            latencies = [latency for _, latency in self.samples]
+        return {"state": self.state, "success_rate": round(self.success_rate(), 3), "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "rejected": self.rejected, "retry_in": round(max(0.0, self.opened_at + self.current_timeout - time.monotonic()), 1) if self.state == "open" else 0.0}
+def wake_on_lan(mac, broadcast="255.255.255.255", port=9):
+    digits = re.sub(r'[^0-9A-Fa-f]', '', mac or '')
+    if len(digits) != 12:
+        raise ValueError(f"Invalid MAC address: {mac}")
+    packet = b'\xff' * 6 + bytes.fromhex(digits) * 16
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.sendto(packet, (broadcast, port))
 class RokuController:
-    def __init__(self, ip_address=None):
+    _sessions = {}
+    _health = {}
+    _sessions_lock = threading.Lock()
+    def __init__(self, ip_address=None, pool_size=4, connect_timeout=2.0, read_timeout=5.0, retries=2, backoff=0.1, registry=None, on_revalidate=None, fetch_info=True, port=ECP_PORT, cache_first=True):
+        self.registry = registry
+        self.port = port
         self.ip_address = ip_address
+        if not self.ip_address and registry:
+            cached = registry.most_recent()
+            if cached:
+                self.ip_address = cached["ip_address"]
+                self.port = cached.get("port", port)
         if not self.ip_address:
             self.ip_address = self.discover_roku()
-        self.base_url = f"http://{self.ip_address}:8060"
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self.base_url = f"http://{self.ip_address}:{self.port}"
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = self.get_session(self.base_url, pool_size, retries, backoff)
+        self.health = self.get_health(self.base_url)
+        self.health.probe = self.probe
         self.app_list = []
-        self.device_info = {}
-        self.get_app_list()
-        self.get_device_info()
-    def discover_roku(self):
+        self.device_info = DeviceInfo()
+        self.last_latency = None
+        self.from_cache = False
+        cached = registry.find_by_ip(self.ip_address, self.port) if registry else None
+        if not fetch_info:
+            self.connected = True
+        elif cached and cache_first:
+            self.load_cached(cached)
+            threading.Thread(target=self.revalidate, args=(on_revalidate,), daemon=True).start()
+        else:
+            self.connected = self.get_app_list()
+            self.get_device_info()
+            if registry and self.connected:
+                registry.remember(self)
+            elif cached:
+                self.load_cached(cached)
+    def load_cached(self, cached):
+        self.app_list = [AppInfo.from_dict(app) for app in cached.get("app_list", [])]
+        self.device_info = DeviceInfo.from_dict(cached.get("device_info", {}))
+        self.connected = True
+        self.from_cache = True
+    def revalidate(self, callback=None):
+        serial = self.device_info.serial_number
+        ok = self.get_device_info() and self.get_app_list()
+        if not ok and serial:
+            for device in discover_devices():
+                if device.serial_number == serial and device.ip_address != self.ip_address:
+                    print(f"Roku {serial} moved to {device.ip_address}")
+                    self.set_ip_address(device.ip_address)
+                    ok = self.get_device_info() and self.get_app_list()
+                    break
+        if ok:
+            self.from_cache = False
+            if self.registry:
+                self.registry.remember(self)
+        if callback:
+            callback(self, ok)
+        return ok
+    def set_ip_address(self, ip_address):
+        self.ip_address = ip_address
+        self.base_url = f"http://{ip_address}:{self.port}"
+        self.session = self.get_session(self.base_url, self.pool_size, self.retries, self.backoff)
+        self.health = self.get_health(self.base_url)
+        self.health.probe = self.probe
+    def discover_roku(self, timeout=5):
         print("Searching for Roku devices on your network...")
-        SSDP_DISCOVER = (
-            'M-SEARCH * HTTP/1.1\r\n' +
-            'HOST: 239.255.255.250:1900\r\n' +
-            'MAN: "ssdp:discover"\r\n' +
-            'ST: roku:ecp\r\n' +
-            'MX: 3\r\n\r\n'
-        )
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(5)
-        try:
-            sock.sendto(SSDP_DISCOVER.encode(), ('239.255.255.250', 1900))
-            start_time = time.time()
-            while time.time() - start_time < 5:
-                try:
-                    data, addr = sock.recvfrom(1024)
-                    response = data.decode('utf-8')
-                    for line in response.split('\r\n'):
-                        if line.lower().startswith('location:'):
-                            url = line.split(' ')[1].strip()
-                            ip = url.split('//')[1].split(':')[0]
-                            print(f"Found Roku device at {ip}")
-                            sock.close()
-                            return ip
-                except socket.timeout:
-                    continue
-            print("No Roku devices found automatically.")
-            return None
-        except Exception as e:
+        devices = iter_discover(timeout)
+        try:
+            device = next(devices, None)
+        except OSError as e:
             print(f"Error during device discovery: {e}")
             return None
         finally:
-            sock.close()
+            devices.close()
+        if device is None:
+            print("No Roku devices answered SSDP, scanning the local network instead.")
+            devices = scan_devices(port=self.port)
+            device = devices[0] if devices else None
+        if device is None:
+            print("No Roku devices found automatically.")
+            return None
+        print(f"Found Roku device at {device.ip_address}")
+        return device.ip_address
+    @classmethod
+    def get_session(cls, base_url, pool_size=4, retries=2, backoff=0.1):
+        with cls._sessions_lock:
+            key = (base_url, pool_size, retries, backoff)
+            session = cls._sessions.get(key)
+            if session is None:
+                retry = Retry(total=retries, connect=retries, read=0, status=0, backoff_factor=backoff, allowed_methods=None)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+                session = requests.Session()
+                session.headers.update({'Connection': 'keep-alive'})
+                session.mount('http://', adapter)
+                cls._sessions[key] = session
+            return session
+    @classmethod
+    def get_health(cls, base_url):
+        with cls._sessions_lock:
+            health = cls._health.get(base_url)
+            if health is None:
+                health = cls._health[base_url] = DeviceHealth()
+            return health
+    @classmethod
+    def close_sessions(cls):
+        with cls._sessions_lock:
+            for session in cls._sessions.values():
+                session.close()
+            cls._sessions.clear()
+    def request(self, method, path):
+        labels = {"endpoint": ecp_endpoint(path), "outcome": "error"}
+        if not self.health.allow():
+            METRICS.incr("roku_circuit_rejected_total", **labels)
+            raise CircuitOpenError(f"Roku at {self.ip_address} is not responding")
+        ok = False
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout)
+            labels["outcome"] = str(response.status_code)
+            ok = response.status_code < 500
+            return response
+        finally:
+            self.last_latency = time.perf_counter() - start
+            self.health.record(ok, self.last_latency)
+            METRICS.observe("roku_ecp_request_seconds", self.last_latency, transport="session", **labels)
+    def probe(self):
+        try:
+            self.request("GET", "/query/device-info")
+        except requests.exceptions.RequestException:
+            pass
+    def wake_mac(self):
+        info = self.device_info
+        if info.network_type == 'ethernet' and info.ethernet_mac:
+            return info.ethernet_mac
+        if info.supports_wake_on_wlan and info.wifi_mac:
+            return info.wifi_mac
+        return None
+    def wake(self, timeout=30.0, interval=0.5, max_interval=4.0):
+        mac = self.wake_mac()
+        if not mac:
+            print(f"Roku at {self.ip_address} does not report Wake-on-LAN support")
+            return False
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                wake_on_lan(mac)
+            except (OSError, ValueError) as e:
+                print(f"Error sending Wake-on-LAN packet: {e}")
+                return False
+            remaining = deadline - time.monotonic()
+            try:
+                response = self.session.get(f"{self.base_url}/query/device-info", timeout=max(0.1, min(interval, remaining)))
+                if response.status_code == 200:
+                    break
+            except requests.exceptions.RequestException:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"Roku at {self.ip_address} did not answer within {timeout:.0f}s of Wake-on-LAN")
+                return False
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, max_interval)
+        self.health.reset()
+        return self.send_keypress("PowerOn")
     def send_keypress(self, key):
-        url = f"{self.base_url}/keypress/{key}"
+        return self.post_key("keypress", key)
+    def send_keydown(self, key):
+        return self.post_key("keydown", key)
+    def send_keyup(self, key):
+        return self.post_key("keyup", key)
+    def post_key(self, action, key):
         try:
-            response = requests.post(url)
+            response = self.request("POST", f"/{action}/{key}")
             return response.status_code == 200
         except requests.exceptions.RequestException:
-            print(f"Error sending '{key}' command to Roku")
+            print(f"Error sending '{key}' {action} to Roku")
             return False
+    def send_text(self, text, pace=0.0, pipeline_depth=8, cancel_event=None, progress=None):
+        paths = [f"/keypress/Lit_{urllib.parse.quote(char, safe='')}" for char in text]
+        total = len(paths)
+        resume = 0
+        delivered = 0
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+        if self.health.state != "closed":
+            print(f"Roku at {self.ip_address} is not responding")
+            return 0
+        try:
+            sock = socket.create_connection((self.ip_address, self.port), timeout=self.timeout[0])
+        except OSError:
+            self.health.record(False, self.timeout[0])
+            sock = None
+        if sock:
+            sock.settimeout(self.timeout[1])
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            reader = sock.makefile('rb')
+            sent = 0
+            acked = 0
+            sent_at = deque()
+            try:
+                while acked < total:
+                    while sent < total and sent - acked < max(1, pipeline_depth) and not cancelled():
+                        if pace and sent:
+                            time.sleep(pace)
+                        sock.sendall((f"POST {paths[sent]} HTTP/1.1\r\n"
+                                      f"Host: {self.ip_address}:{self.port}\r\n"
+                                      "Content-Length: 0\r\n"
+                                      "Connection: keep-alive\r\n\r\n").encode())
+                        sent_at.append(time.perf_counter())
+                        sent += 1
+                    if sent == acked:
+                        break
+                    status, _, keep_alive = read_http_response(reader)
+                    METRICS.observe("roku_ecp_request_seconds", time.perf_counter() - sent_at.popleft(), transport="pipelined", endpoint="keypress", outcome=str(status))
+                    acked += 1
+                    if status == 200:
+                        delivered += 1
+                    if progress:
+                        progress(acked, total)
+                    if not keep_alive:
+                        break
+                resume = acked
+            except (OSError, ValueError, IndexError) as e:
+                resume = sent
+                if sent > acked:
+                    print(f"Text entry interrupted; {sent - acked} character(s) after position {acked} may not have been typed: {e}")
+            finally:
+                reader.close()
+                sock.close()
+        for index in range(resume, total):
+            if cancelled():
+                break
+            if pace and index:
+                time.sleep(pace)
+            try:
+                response = self.request("POST", paths[index])
+                if response.status_code == 200:
+                    delivered += 1
+            except requests.exceptions.RequestException as e:
+                print(f"Error sending text to Roku: {e}")
+                break
+            if progress:
+                progress(index + 1, total)
+        return delivered
     def launch_app(self, app_id):
-        url = f"{self.base_url}/launch/{app_id}"
         try:
-            response = requests.post(url)
+            response = self.request("POST", f"/launch/{app_id}")
             return response.status_code == 200
         except requests.exceptions.RequestException:
             print(f"Error launching app {app_id}")
             return False
     def get_app_list(self):
-        url = f"{self.base_url}/query/apps"
         try:
-            response = requests.get(url)
+            response = self.request("GET", "/query/apps")
             if response.status_code == 200:
-                root = ET.fromstring(response.text)
-                self.app_list = []
-                for app in root.findall('.//app'):
-                    app_id = app.get('id')
-                    app_name = app.text
-                    self.app_list.append((app_id, app_name))
+                self.app_list = timed_parse("apps", parse_app_list, response.content)
                 return True
             return False
         except requests.exceptions.RequestException:
@@ -88,13 +867,10 @@ class RokuController:
             print("Error parsing app list XML")
             return False
     def get_device_info(self):
-        url = f"{self.base_url}/query/device-info"
         try:
-            response = requests.get(url)
+            response = self.request("GET", "/query/device-info")
             if response.status_code == 200:
-                root = ET.fromstring(response.text)
-                for child in root:
-                    self.device_info[child.tag] = child.text
+                self.device_info = timed_parse("device-info", parse_device_info, response.content)
                 return True
             return False
         except requests.exceptions.RequestException:
@@ -103,42 +879,1947 @@ class RokuController:
         except ET.ParseError:
             print("Error parsing device info XML")
             return False
+    def get_app_icon(self, app_id):
+        try:
+            response = self.request("GET", f"/query/icon/{app_id}")
+            if response.status_code == 200 and response.content:
+                return response.content
+            return None
+        except requests.exceptions.RequestException:
+            print(f"Error getting icon for app {app_id}")
+            return None
+    def get_active_app(self):
+        try:
+            response = self.request("GET", "/query/active-app")
+            if response.status_code == 200:
+                return timed_parse("active-app", parse_active_app, response.content)
+            return None
+        except requests.exceptions.RequestException:
+            print("Error getting active app")
+            return None
+        except ET.ParseError:
+            print("Error parsing active app XML")
+            return None
+    def get_media_player(self):
+        try:
+            response = self.request("GET", "/query/media-player")
+            if response.status_code == 200:
+                return timed_parse("media-player", parse_media_player, response.content)
+            return None
+        except requests.exceptions.RequestException:
+            print("Error getting media player state")
+            return None
+        except ET.ParseError:
+            print("Error parsing media player XML")
+            return None
+class AsyncRokuController:
+    def __init__(self, ip_address=None, pool_size=4, connect_timeout=2.0, read_timeout=5.0, port=ECP_PORT):
+        self.ip_address = ip_address
+        self.port = port
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.idle_connections = []
+        self.semaphore = None
+        self.health = RokuController.get_health(f"http://{ip_address}:{port}") if ip_address else DeviceHealth()
+        self.app_list = []
+        self.device_info = DeviceInfo()
+    @classmethod
+    async def create(cls, ip_address=None, **kwargs):
+        roku = cls(ip_address, **kwargs)
+        if not roku.ip_address:
+            roku.ip_address = await roku.discover_roku()
+            roku.health = RokuController.get_health(f"http://{roku.ip_address}:{roku.port}")
+        if roku.ip_address:
+            await roku.get_app_list()
+            await roku.get_device_info()
+        return roku
+    async def discover_roku(self, timeout=5):
+        print("Searching for Roku devices on your network...")
+        devices = await self.discover_devices(timeout, first_only=True)
+        if not devices:
+            print("No Roku devices found automatically.")
+            return None
+        print(f"Found Roku device at {devices[0].ip_address}")
+        return devices[0].ip_address
+    @staticmethod
+    async def discover_devices(timeout=None, mx=3, callback=None, address=SSDP_ADDRESS, first_only=False):
+        if timeout is None:
+            timeout = mx + 1
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        devices = {}
+        class DiscoveryProtocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                device = parse_ssdp_response(data, addr)
+                if device is None or device.key in devices or done.done():
+                    return
+                devices[device.key] = device
+                if callback:
+                    callback(device)
+                if first_only:
+                    done.set_result(None)
+        transport, _ = await loop.create_datagram_endpoint(DiscoveryProtocol, family=socket.AF_INET)
+        try:
+            transport.sendto(ssdp_search_request(mx).encode(), address)
+            await asyncio.wait_for(done, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            transport.close()
+        return list(devices.values())
+    async def request(self, method, path):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.pool_size)
+        if not self.health.allow():
+            raise CircuitOpenError(f"Roku at {self.ip_address} is not responding")
+        outcome = "error"
+        ok = False
+        start = time.perf_counter()
+        try:
+            status, body = await self.send_request(method, path)
+            outcome = str(status)
+            ok = status < 500
+            return status, body
+        finally:
+            self.health.record(ok, time.perf_counter() - start)
+            METRICS.observe("roku_ecp_request_seconds", time.perf_counter() - start, transport="async", endpoint=ecp_endpoint(path), outcome=outcome)
+    async def send_request(self, method, path):
+        async with self.semaphore:
+            for attempt in range(2):
+                reused = bool(self.idle_connections)
+                if reused:
+                    reader, writer = self.idle_connections.pop()
+                else:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(self.ip_address, self.port), self.connect_timeout)
+                try:
+                    writer.write((f"{method} {path} HTTP/1.1\r\n"
+                                  f"Host: {self.ip_address}:{self.port}\r\n"
+                                  "Content-Length: 0\r\n"
+                                  "Connection: keep-alive\r\n\r\n").encode())
+                    await writer.drain()
+                    status, body, keep_alive = await asyncio.wait_for(self.read_response(reader), self.read_timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                if keep_alive:
+                    self.idle_connections.append((reader, writer))
+                else:
+                    writer.close()
+                return status, body
+    @staticmethod
+    async def read_response(reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by Roku")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        if 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status, body, keep_alive
+    async def send_keypress(self, key):
+        return await self.post_key("keypress", key)
+    async def send_keydown(self, key):
+        return await self.post_key("keydown", key)
+    async def send_keyup(self, key):
+        return await self.post_key("keyup", key)
+    async def post_key(self, action, key):
+        try:
+            status, _ = await self.request("POST", f"/{action}/{key}")
+            return status == 200
+        except (OSError, asyncio.TimeoutError):
+            print(f"Error sending '{key}' {action} to Roku")
+            return False
+    async def launch_app(self, app_id):
+        try:
+            status, _ = await self.request("POST", f"/launch/{app_id}")
+            return status == 200
+        except (OSError, asyncio.TimeoutError):
+            print(f"Error launching app {app_id}")
+            return False
+    async def get_app_list(self):
+        try:
+            status, body = await self.request("GET", "/query/apps")
+            if status == 200:
+                self.app_list = timed_parse("apps", parse_app_list, body)
+                return True
+            return False
+        except (OSError, asyncio.TimeoutError):
+            print("Error getting app list")
+            return False
+        except ET.ParseError:
+            print("Error parsing app list XML")
+            return False
+    async def get_device_info(self):
+        try:
+            status, body = await self.request("GET", "/query/device-info")
+            if status == 200:
+                self.device_info = timed_parse("device-info", parse_device_info, body)
+                return True
+            return False
+        except (OSError, asyncio.TimeoutError):
+            print("Error getting device info")
+            return False
+        except ET.ParseError:
+            print("Error parsing device info XML")
+            return False
+    async def close(self):
+        while self.idle_connections:
+            _, writer = self.idle_connections.pop()
+            writer.close()
+class UIUpdateBus:
+    def __init__(self, root, interval=16, budget=0.008):
+        self.root = root
+        self.interval = interval
+        self.budget = budget
+        self.keyed = {}
+        self.calls = deque()
+        self.lock = threading.Lock()
+        self.posted = 0
+        self.coalesced = 0
+        self.applied = 0
+        self.running = True
+        self.root.after(interval, self.pump)
+    def set(self, var, value):
+        self.update(str(var), var.set, value)
+    def update(self, key, fn, *args, **kwargs):
+        now = time.perf_counter()
+        with self.lock:
+            self.posted += 1
+            previous = self.keyed.get(key)
+            if previous:
+                self.coalesced += 1
+                now = previous[3]
+            self.keyed[key] = (fn, args, kwargs, now)
+    def call(self, fn, *args, **kwargs):
+        with self.lock:
+            self.posted += 1
+        self.calls.append((fn, args, kwargs, time.perf_counter()))
+    def pending(self):
+        return len(self.keyed) + len(self.calls)
+    def apply(self, fn, args, kwargs, enqueued):
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            print(f"Error applying UI update: {e}")
+        self.applied += 1
+        METRICS.observe("roku_ui_update_lag_seconds", time.perf_counter() - enqueued)
+    def pump(self):
+        start = time.perf_counter()
+        deadline = start + self.budget
+        while self.calls:
+            self.apply(*self.calls.popleft())
+            if time.perf_counter() >= deadline:
+                break
+        with self.lock:
+            keyed, self.keyed = ({}, self.keyed) if self.calls else (self.keyed, {})
+        for update in keyed.values():
+            self.apply(*update)
+        METRICS.observe("roku_tk_refresh_seconds", time.perf_counter() - start, view="bus")
+        if self.running:
+            self.root.after(1 if self.calls else self.interval, self.pump)
+    def stop(self):
+        self.running = False
+class TkAsyncBridge:
+    def __init__(self, root, ui=None, workers=6):
+        self.root = root
+        self.post = ui.call if ui else lambda fn, *args: root.after(0, fn, *args)
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="roku-bridge")
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+    def run(self, fn, *args, callback=None, errback=None):
+        async def call():
+            return await self.loop.run_in_executor(self.executor, lambda: fn(*args))
+        return self.submit(call(), callback, errback)
+    def submit(self, coro, callback=None, errback=None):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        def done(f):
+            try:
+                result = f.result()
+            except Exception as e:
+                if errback:
+                    self.post(errback, e)
+                return
+            if callback:
+                self.post(callback, result)
+        future.add_done_callback(done)
+        return future
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+class KeyDispatcher:
+    NAVIGATION_KEYS = ("Up", "Down", "Left", "Right", "Fwd", "Rev")
+    REPEAT_KEYS = ("Up", "Down", "Left", "Right", "VolumeUp", "VolumeDown")
+    def __init__(self, roku, callback=None, max_queue=64, coalesce=False, coalesce_threshold=3, hold_interval=0.12,
+                 hold_callback=None, repeat_delay=0.35, repeat_interval=0.1, rtt_headroom=1.5):
+        self.roku = roku
+        self.callback = callback
+        self.hold_callback = hold_callback
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.coalesce = coalesce
+        self.coalesce_threshold = coalesce_threshold
+        self.hold_interval = hold_interval
+        self.repeat_delay = repeat_delay
+        self.repeat_interval = repeat_interval
+        self.rtt_headroom = rtt_headroom
+        self.rtt = None
+        self.held = None
+        self.holds = 0
+        self.released_at = None
+        self.release_event = threading.Event()
+        self.sent = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+        self.pending = None
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    def submit(self, key, token=None):
+        try:
+            self.queue.put_nowait((key, token, None))
+            return True
+        except queue.Full:
+            return False
+    def hold(self, key, token=None):
+        self.holds += 1
+        hold_id = self.holds
+        self.held = hold_id
+        self.released_at = None
+        self.release_event.clear()
+        try:
+            self.queue.put_nowait((key, token, hold_id))
+            return True
+        except queue.Full:
+            self.held = None
+            return False
+    def release(self):
+        if self.held is not None:
+            self.held = None
+            self.released_at = time.perf_counter()
+            self.release_event.set()
+    def next_repeat_interval(self):
+        return max(self.repeat_interval, (self.rtt or 0.0) * self.rtt_headroom)
+    def measure_rtt(self, rtt):
+        self.rtt = rtt if self.rtt is None else self.rtt + 0.2 * (rtt - self.rtt)
+    def queue_depth(self):
+        return self.queue.qsize() + (1 if self.pending else 0)
+    def average_latency(self):
+        return self.total_latency / self.sent if self.sent else 0.0
+    def stop(self):
+        self.running = False
+        self.release()
+        self.queue.put(None)
+        self.thread.join(timeout=1)
+    def run(self):
+        while self.running:
+            entry = self.pending or self.queue.get()
+            self.pending = None
+            if entry is None:
+                break
+            key = entry[0]
+            if entry[2] is not None:
+                self.repeat(key, entry[1], entry[2])
+                continue
+            tokens = [entry[1]]
+            if self.coalesce and key in self.NAVIGATION_KEYS:
+                while True:
+                    try:
+                        next_entry = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if next_entry is None or next_entry[0] != key or next_entry[2] is not None:
+                        self.pending = next_entry
+                        break
+                    tokens.append(next_entry[1])
+            count = len(tokens)
+            start = time.perf_counter()
+            try:
+                if count >= self.coalesce_threshold:
+                    ok = self.roku.send_keydown(key)
+                    if ok:
+                        time.sleep(self.hold_interval * count)
+                    ok = self.roku.send_keyup(key) and ok
+                else:
+                    ok = True
+                    for _ in range(count):
+                        ok = self.roku.send_keypress(key) and ok
+            except Exception as e:
+                print(f"Error dispatching '{key}': {e}")
+                ok = False
+            latency = time.perf_counter() - start
+            if ok and count < self.coalesce_threshold:
+                self.measure_rtt(latency / count)
+            self.sent += count
+            self.total_latency += latency
+            self.last_latency = latency
+            if self.callback:
+                for token in tokens:
+                    self.callback(key, ok, latency, token)
+    def repeat(self, key, token, hold_id):
+        start = time.perf_counter()
+        count = 0
+        overshoot = 0
+        rtt_total = 0.0
+        ok = True
+        next_at = start
+        while self.running:
+            now = time.perf_counter()
+            if count and now < next_at and self.release_event.wait(next_at - now):
+                break
+            if count and self.held != hold_id:
+                break
+            sent_at = time.perf_counter()
+            if self.released_at is not None and self.held != hold_id and sent_at > self.released_at and count:
+                overshoot += 1
+            try:
+                ok = self.roku.send_keypress(key)
+            except Exception as e:
+                print(f"Error dispatching '{key}': {e}")
+                ok = False
+            rtt = time.perf_counter() - sent_at
+            count += 1
+            rtt_total += rtt
+            if not ok:
+                break
+            self.measure_rtt(rtt)
+            next_at = sent_at + (self.repeat_delay if count == 1 else self.next_repeat_interval())
+        end = time.perf_counter()
+        release_lag = end - self.released_at if self.released_at is not None and self.held != hold_id else 0.0
+        self.sent += count
+        self.total_latency += rtt_total
+        self.last_latency = rtt_total / count if count else 0.0
+        stats = {"count": count, "duration": end - start, "rtt": self.last_latency, "interval": self.next_repeat_interval(), "overshoot": overshoot, "release_lag": release_lag}
+        METRICS.observe("roku_key_release_seconds", release_lag, key=key)
+        METRICS.incr("roku_key_repeat_presses_total", count, key=key)
+        METRICS.incr("roku_key_repeat_overshoot_total", overshoot, key=key)
+        if self.hold_callback:
+            self.hold_callback(key, ok, stats, token)
+class DeviceStateMonitor:
+    QUIET_FIELDS = ("uptime", "position")
+    def __init__(self, roku, callback, min_interval=1.0, max_interval=15.0, backoff=1.5, info_interval=60.0, offline_interval=60.0):
+        self.roku = roku
+        self.callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.info_interval = info_interval
+        self.offline_interval = offline_interval
+        self.interval = min_interval
+        self.snapshot = {}
+        self.last_info = 0.0
+        self.polls = 0
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.roku.health.listeners.append(self.on_health)
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+    def stop(self):
+        self.running = False
+        if self.on_health in self.roku.health.listeners:
+            self.roku.health.listeners.remove(self.on_health)
+        self.wake.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+    def poke(self):
+        self.interval = self.min_interval
+        self.wake.set()
+    def on_health(self, state):
+        if state == "closed" and self.snapshot.get("reachable") is False:
+            self.poke()
+    def fetch(self, path, document, parse):
+        response = self.roku.request("GET", path)
+        if response.status_code != 200:
+            return None
+        return timed_parse(document, parse, response.content)
+    def poll(self):
+        if self.roku.health.state == "open":
+            return {"reachable": False}
+        state = {"reachable": True}
+        app = self.fetch("/query/active-app", "active-app", parse_active_app)
+        if app is None:
+            state["reachable"] = False
+        else:
+            state["active_app"] = app.name or "Home"
+            player = self.fetch("/query/media-player", "media-player", parse_media_player)
+            if player:
+                state["player_state"] = player["state"]
+                state["position"] = player["position"]
+                state["duration"] = player["duration"]
+        now = time.monotonic()
+        if state["reachable"] and now - self.last_info >= self.info_interval:
+            info = self.fetch("/query/device-info", "device-info", parse_device_info)
+            if info:
+                self.roku.device_info = info
+                self.last_info = now
+                state.update(info.to_dict())
+        self.polls += 1
+        return state
+    def diff(self, state):
+        return {key: value for key, value in state.items() if self.snapshot.get(key, object()) != value}
+    def run(self):
+        while self.running:
+            error = None
+            try:
+                state = self.poll()
+            except (requests.exceptions.RequestException, ET.ParseError) as e:
+                error = e
+                state = {"reachable": False}
+            if not self.running:
+                return
+            changes = self.diff(state)
+            if "reachable" in changes:
+                if changes["reachable"]:
+                    if "reachable" in self.snapshot:
+                        print(f"Roku at {self.roku.ip_address} is reachable again")
+                else:
+                    print(f"Lost contact with Roku at {self.roku.ip_address}" + (f": {error}" if error else ""))
+            self.snapshot.update(changes)
+            if not state["reachable"]:
+                self.interval = min(max(self.interval, self.min_interval) * self.backoff, self.offline_interval)
+            elif any(key not in self.QUIET_FIELDS for key in changes):
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+            if changes:
+                self.callback(changes)
+            self.wake.wait(self.interval)
+            self.wake.clear()
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+class FleetResult:
+    def __init__(self, operation):
+        self.operation = operation
+        self.results = {}
+        self.elapsed = 0.0
+    def record(self, ip_address, ok, latency, attempts, value=None, error=None):
+        self.results[ip_address] = {"ok": ok, "latency": latency, "attempts": attempts, "value": value, "error": error}
+    @property
+    def succeeded(self):
+        return [ip for ip, result in self.results.items() if result["ok"]]
+    @property
+    def failed(self):
+        return [ip for ip, result in self.results.items() if not result["ok"]]
+    def latency_stats(self):
+        latencies = [result["latency"] for result in self.results.values() if result["ok"]]
+        return {
+            "count": len(latencies),
+            "min": min(latencies, default=0.0),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": max(latencies, default=0.0)
+        }
+    def summary(self):
+        stats = self.latency_stats()
+        return (f"{self.operation}: {len(self.succeeded)}/{len(self.results)} ok in {self.elapsed * 1000:.0f} ms "
+                f"(p50 {stats['p50'] * 1000:.0f} ms, p95 {stats['p95'] * 1000:.0f} ms, max {stats['max'] * 1000:.0f} ms)")
+class FleetController:
+    def __init__(self, ip_addresses, max_workers=16, connect_timeout=1.0, read_timeout=3.0, retries=1):
+        self.max_workers = max_workers
+        self.retries = retries
+        self.device_timeout = connect_timeout + read_timeout
+        self.controllers = {}
+        for ip in ip_addresses:
+            host, port = split_host_port(ip)
+            self.controllers[ip] = RokuController(host, connect_timeout=connect_timeout, read_timeout=read_timeout, retries=0, fetch_info=False, port=port)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fleet")
+    def call(self, ip_address, operation):
+        start = time.perf_counter()
+        try:
+            value = operation(self.controllers[ip_address])
+            error = None
+        except Exception as e:
+            value = False
+            error = str(e)
+        return value, error, time.perf_counter() - start
+    def run(self, name, operation, result_of=bool, timeout=None):
+        timeout = timeout or self.device_timeout * 2
+        result = FleetResult(name)
+        start = time.perf_counter()
+        pending = list(self.controllers)
+        for attempt in range(1, self.retries + 2):
+            futures = {self.executor.submit(self.call, ip, operation): ip for ip in pending}
+            done, not_done = wait(futures, timeout=timeout)
+            pending = []
+            for future in done:
+                ip = futures[future]
+                value, error, latency = future.result()
+                ok = bool(result_of(value)) and error is None
+                result.record(ip, ok, latency, attempt, value, error)
+                if not ok and self.controllers[ip].health.state == "closed":
+                    pending.append(ip)
+            for future in not_done:
+                result.record(futures[future], False, timeout, attempt, error="timed out")
+            if not pending:
+                break
+        result.elapsed = time.perf_counter() - start
+        return result
+    def send_keypress(self, key):
+        return self.run(f"keypress {key}", lambda roku: roku.send_keypress(key))
+    def launch_app(self, app_id):
+        return self.run(f"launch {app_id}", lambda roku: roku.launch_app(app_id))
+    def get_device_info(self):
+        return self.run("device-info", lambda roku: roku.device_info.to_dict() if roku.get_device_info() else None)
+    def get_app_list(self):
+        return self.run("apps", lambda roku: [app.to_dict() for app in roku.app_list] if roku.get_app_list() else None)
+    def close(self):
+        self.executor.shutdown(wait=False)
+class FleetGroups:
+    def __init__(self, groups_file="fleet_groups.json"):
+        self.groups_file = groups_file
+        self.groups = {}
+        self.load_groups()
+    def load_groups(self):
+        if os.path.exists(self.groups_file):
+            try:
+                with open(self.groups_file, 'r') as f:
+                    self.groups = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                self.groups = {}
+        else:
+            self.groups = {}
+    def save_groups(self):
+        with open(self.groups_file, 'w') as f:
+            json.dump(self.groups, f, indent=2)
+    def names(self):
+        return sorted(self.groups)
+    def get(self, name):
+        return list(self.groups.get(name, []))
+    def set_group(self, name, ip_addresses):
+        self.groups[name] = sorted(set(ip_addresses))
+        self.save_groups()
+    def delete_group(self, name):
+        if self.groups.pop(name, None) is not None:
+            self.save_groups()
+class Macro:
+    def __init__(self, name, steps=None):
+        self.name = name
+        self.steps = steps or []
+    def to_dict(self):
+        return {"name": self.name, "steps": self.steps}
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"], list(data.get("steps", [])))
+    @classmethod
+    def from_history(cls, name, items):
+        steps = []
+        last_time = None
+        for item in items:
+            if item.get("status") != "Started":
+                continue
+            details = item.get("details", "")
+            if item.get("action") == "Send Key":
+                match = re.match(r"Sending (\S+) command", details)
+                step = {"type": "key", "value": match.group(1)} if match else None
+            elif item.get("action") == "Launch App":
+                match = re.search(r"\(ID: ([^)]+)\)", details)
+                step = {"type": "launch", "value": match.group(1)} if match else None
+            else:
+                step = None
+            if step is None:
+                continue
+            when = item_time(item)
+            if when is None:
+                when = last_time
+            step["delay"] = max(0.0, when - last_time) if when is not None and last_time is not None else 0.0
+            last_time = when
+            steps.append(step)
+        return cls(name, steps)
+class MacroRecorder:
+    def __init__(self):
+        self.recording = False
+        self.steps = []
+        self.last_time = None
+    def start(self):
+        self.recording = True
+        self.steps = []
+        self.last_time = None
+    def record(self, step_type, value):
+        if not self.recording:
+            return
+        now = time.perf_counter()
+        delay = now - self.last_time if self.last_time is not None else 0.0
+        self.last_time = now
+        self.steps.append({"type": step_type, "value": value, "delay": round(delay, 3)})
+    def stop(self, name):
+        self.recording = False
+        return Macro(name, self.steps)
+class MacroPlayer:
+    def __init__(self, roku, launch_timeout=20.0, poll_interval=0.25):
+        self.roku = roku
+        self.launch_timeout = launch_timeout
+        self.poll_interval = poll_interval
+    def wait_for_app(self, app_id, cancel_event):
+        deadline = time.perf_counter() + self.launch_timeout
+        while time.perf_counter() < deadline:
+            active = self.roku.get_active_app()
+            if active and active.id == app_id:
+                return True
+            if cancel_event.wait(self.poll_interval):
+                return False
+        return False
+    def run_step(self, step, cancel_event):
+        if step["type"] == "key":
+            return self.roku.send_keypress(step["value"])
+        if step["type"] == "launch":
+            return self.roku.launch_app(step["value"]) and self.wait_for_app(step["value"], cancel_event)
+        if step["type"] == "text":
+            return self.roku.send_text(step["value"], cancel_event=cancel_event) == len(step["value"])
+        print(f"Unknown macro step type {step['type']}")
+        return False
+    def play(self, macro, realtime=False, cancel_event=None):
+        cancel_event = cancel_event or threading.Event()
+        start = time.perf_counter()
+        scheduled = start
+        drifts = []
+        completed = 0
+        ok = True
+        for step in macro.steps:
+            if realtime:
+                scheduled += step.get("delay", 0.0)
+                if cancel_event.wait(max(0.0, scheduled - time.perf_counter())):
+                    ok = False
+                    break
+            else:
+                scheduled = time.perf_counter()
+            drifts.append(time.perf_counter() - scheduled)
+            if cancel_event.is_set() or not self.run_step(step, cancel_event):
+                ok = False
+                break
+            completed += 1
+        return {
+            "ok": ok and completed == len(macro.steps),
+            "completed": completed,
+            "steps": len(macro.steps),
+            "elapsed": time.perf_counter() - start,
+            "drift_mean": sum(drifts) / len(drifts) if drifts else 0.0,
+            "drift_max": max(drifts, default=0.0)
+        }
+def macro_report(macro, result):
+    return (f"{macro.name}: {result['completed']}/{result['steps']} steps in {result['elapsed']:.2f} s, "
+            f"drift mean {result['drift_mean'] * 1000:.1f} ms, max {result['drift_max'] * 1000:.1f} ms")
+class MacroStore:
+    def __init__(self, macros_file="macros.json"):
+        self.macros_file = macros_file
+        self.macros = {}
+        self.schedules = []
+        self.load_macros()
+    def load_macros(self):
+        if os.path.exists(self.macros_file):
+            try:
+                with open(self.macros_file, 'r') as f:
+                    data = json.load(f)
+                self.macros = {name: Macro.from_dict(macro) for name, macro in data.get("macros", {}).items()}
+                self.schedules = data.get("schedules", [])
+            except (json.JSONDecodeError, OSError, KeyError):
+                self.macros = {}
+                self.schedules = []
+    def save_macros(self):
+        with open(self.macros_file, 'w') as f:
+            json.dump({"macros": {name: macro.to_dict() for name, macro in self.macros.items()}, "schedules": self.schedules}, f, indent=2)
+    def names(self):
+        return sorted(self.macros)
+    def get(self, name):
+        return self.macros.get(name)
+    def save_macro(self, macro):
+        self.macros[macro.name] = macro
+        self.save_macros()
+    def delete_macro(self, name):
+        self.macros.pop(name, None)
+        self.schedules = [entry for entry in self.schedules if entry["macro"] != name]
+        self.save_macros()
+    def add_schedule(self, macro_name, at, ip_addresses=None, group=None, realtime=False):
+        entry = {"macro": macro_name, "at": at, "ip_addresses": ip_addresses or [], "group": group, "realtime": realtime}
+        self.schedules.append(entry)
+        self.save_macros()
+        return entry
+class MacroScheduler:
+    def __init__(self, store, groups=None, callback=None):
+        self.store = store
+        self.groups = groups or FleetGroups()
+        self.callback = callback
+        self.heap = []
+        self.counter = 0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+    @staticmethod
+    def next_run(at, now=None):
+        now = now or datetime.datetime.now()
+        hour, minute = (int(part) for part in at.split(":"))
+        run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if run <= now:
+            run += datetime.timedelta(days=1)
+        return run.timestamp()
+    def add(self, entry):
+        with self.lock:
+            self.counter += 1
+            heapq.heappush(self.heap, (self.next_run(entry["at"]), self.counter, entry))
+        self.wakeup.set()
+    def start(self):
+        for entry in self.store.schedules:
+            self.add(entry)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+    def run(self):
+        while self.running:
+            with self.lock:
+                delay = self.heap[0][0] - time.time() if self.heap else 60
+            if delay > 0:
+                self.wakeup.wait(min(delay, 60))
+                self.wakeup.clear()
+                continue
+            with self.lock:
+                _, _, entry = heapq.heappop(self.heap)
+            threading.Thread(target=self.execute, args=(entry,), daemon=True).start()
+            self.add(entry)
+    def targets(self, entry):
+        if entry.get("group"):
+            return self.groups.get(entry["group"])
+        return entry.get("ip_addresses", [])
+    def execute(self, entry):
+        macro = self.store.get(entry["macro"])
+        ip_addresses = self.targets(entry)
+        if macro is None or not ip_addresses:
+            print(f"Skipping scheduled macro {entry['macro']}: macro or targets missing")
+            return
+        fleet = FleetController(ip_addresses, read_timeout=5.0, retries=0)
+        timeout = 60 + sum(step.get("delay", 0.0) + (MacroPlayer(None).launch_timeout if step["type"] == "launch" else 0) for step in macro.steps)
+        result = fleet.run(f"macro {macro.name}", lambda roku: MacroPlayer(roku).play(macro, entry.get("realtime", False)), result_of=lambda value: value and value["ok"], timeout=timeout)
+        fleet.close()
+        if self.callback:
+            self.callback(entry, result)
+        else:
+            print(result.summary())
+class IconCache:
+    def __init__(self, directory="icon_cache", max_bytes=16 * 1024 * 1024, memory_items=128, max_workers=8):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.max_workers = max_workers
+        self.memory = OrderedDict()
+        self.disk = OrderedDict()
+        self.disk_bytes = 0
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.load_index()
+    def load_index(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = [entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith(".tmp")]
+        except OSError as e:
+            print(f"Error reading icon cache: {str(e)}")
+            return
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            size = entry.stat().st_size
+            self.disk[entry.name] = size
+            self.disk_bytes += size
+    def key(self, app_id, version=None):
+        return re.sub(r'[^A-Za-z0-9._-]', '_', f"{app_id}-{version or '0'}")
+    def get(self, app_id, version=None):
+        key = self.key(app_id, version)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key]
+            if key not in self.disk:
+                self.misses += 1
+                return None
+            self.disk.move_to_end(key)
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.disk_bytes -= self.disk.pop(key, 0)
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+            self.remember(key, data)
+        return data
+    def remember(self, key, data):
+        self.memory[key] = data
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+    def put(self, app_id, version, data):
+        key = self.key(app_id, version)
+        prefix = self.key(app_id, "")[:-1]
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"Error caching icon for app {app_id}: {str(e)}")
+            return
+        with self.lock:
+            self.remember(key, data)
+            stale = [name for name in self.disk if name.startswith(prefix) and name != key]
+            self.disk_bytes += len(data) - self.disk.pop(key, 0)
+            self.disk[key] = len(data)
+            while self.disk_bytes > self.max_bytes and len(self.disk) > 1:
+                name, _ = next(iter(self.disk.items()))
+                stale.append(name)
+                self.disk_bytes -= self.disk.pop(name)
+            for name in stale:
+                self.disk_bytes -= self.disk.pop(name, 0)
+                self.memory.pop(name, None)
+        for name in stale:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+    def contains(self, app_id, version=None):
+        key = self.key(app_id, version)
+        with self.lock:
+            return key in self.memory or key in self.disk
+    def fetch_missing(self, roku, apps, callback=None):
+        with self.lock:
+            missing = []
+            for app in apps:
+                key = self.key(app.id, app.version)
+                if app.id not in self.pending and key not in self.memory and key not in self.disk:
+                    missing.append(app)
+            self.pending.update(app.id for app in missing)
+        if not missing:
+            return 0
+        def fetch(app):
+            try:
+                data = roku.get_app_icon(app.id)
+                if data:
+                    self.put(app.id, app.version, data)
+                if callback:
+                    callback(app.id, data)
+            finally:
+                with self.lock:
+                    self.pending.discard(app.id)
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing)))
+        for app in missing:
+            executor.submit(fetch, app)
+        executor.shutdown(wait=False)
+        return len(missing)
+def app_usage(items):
+    usage = Counter()
+    for item in items:
+        if item.get("action") == "Launch App" and item.get("status") == "Success":
+            match = re.search(r"\(ID: ([^)]+)\)$", item.get("details", ""))
+            if match:
+                usage[match.group(1)] += 1
+    return usage
+def quick_launch_apps(app_list, usage, count=3):
+    ranked = sorted(enumerate(app_list), key=lambda pair: (-usage[pair[1].id], pair[0]))
+    return [app for _, app in ranked[:count]]
+class DeviceRegistry:
+    def __init__(self, registry_file="device_registry.json"):
+        self.registry_file = registry_file
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.devices = {}
+        self.load_registry()
+    def load_registry(self):
+        if os.path.exists(self.registry_file):
+            try:
+                with open(self.registry_file, 'r') as f:
+                    self.devices = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                self.devices = {}
+        else:
+            self.devices = {}
+    def save_registry(self):
+        with self.save_lock:
+            with self.lock:
+                data = json.dumps(self.devices)
+            fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(self.registry_file) + ".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(self.registry_file)))
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp_file, self.registry_file)
+    def get(self, serial):
+        return self.devices.get(serial)
+    @staticmethod
+    def address(entry):
+        return join_host_port(entry.get("ip_address"), entry.get("port", ECP_PORT))
+    def find_by_ip(self, ip_address, port=ECP_PORT):
+        address = join_host_port(ip_address, port)
+        with self.lock:
+            for entry in self.devices.values():
+                if self.address(entry) == address:
+                    return entry
+        return None
+    def most_recent(self):
+        with self.lock:
+            if not self.devices:
+                return None
+            return max(self.devices.values(), key=lambda entry: entry.get("last_seen", 0))
+    def known_devices(self):
+        with self.lock:
+            entries = sorted(self.devices.items(), key=lambda item: item[1].get("last_seen", 0), reverse=True)
+        return [RokuDevice(entry["ip_address"], entry.get("location") or f"http://{entry['ip_address']}:{entry.get('port', ECP_PORT)}/", entry.get("usn"), serial) for serial, entry in entries]
+    def remember(self, roku):
+        serial = roku.device_info.serial_number
+        if not serial:
+            return
+        address = join_host_port(roku.ip_address, roku.port)
+        with self.lock:
+            for other_serial, entry in list(self.devices.items()):
+                if other_serial != serial and self.address(entry) == address:
+                    del self.devices[other_serial]
+            entry = self.devices.setdefault(serial, {})
+            entry.update({
+                "ip_address": roku.ip_address,
+                "port": roku.port,
+                "device_info": roku.device_info.to_dict(),
+                "app_list": [app.to_dict() for app in roku.app_list],
+                "last_seen": time.time()
+            })
+        self.save_registry()
+    def update_location(self, device):
+        if not device.serial_number:
+            return False
+        with self.lock:
+            entry = self.devices.get(device.serial_number)
+            if entry is None or self.address(entry) == join_host_port(device.ip_address, device.port):
+                if entry is not None:
+                    entry["last_seen"] = time.time()
+                return False
+            entry.update({"ip_address": device.ip_address, "port": device.port, "location": device.location, "usn": device.usn, "last_seen": time.time()})
+        self.save_registry()
+        return True
+class SSDPNotifyListener:
+    def __init__(self, callback, address=SSDP_ADDRESS):
+        self.callback = callback
+        self.address = address
+        self.sock = None
+        self.listening = False
+        self.thread = None
+    def start(self):
+        if self.listening:
+            return True
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, 'SO_REUSEPORT'):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(('', self.address[1]))
+            membership = socket.inet_aton(self.address[0]) + socket.inet_aton('0.0.0.0')
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            sock.settimeout(1)
+        except OSError as e:
+            print(f"Could not listen for SSDP NOTIFY messages: {e}")
+            return False
+        self.sock = sock
+        self.listening = True
+        self.thread = threading.Thread(target=self.listen_loop, daemon=True)
+        self.thread.start()
+        return True
+    def stop(self):
+        self.listening = False
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+    def listen_loop(self):
+        try:
+            while self.listening:
+                try:
+                    data, addr = self.sock.recvfrom(65507)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                if not data.startswith(b'NOTIFY') or b'ssdp:byebye' in data.lower():
+                    continue
+                device = parse_ssdp_response(data, addr)
+                if device and device.serial_number:
+                    self.callback(device)
+        finally:
+            self.sock.close()
+HISTORY_TIME_FORMAT = "%m-%d-%Y %I:%M:%S %p"
+FAILURE_STATUSES = ("Failed", "Error")
+def item_time(item):
+    ts = item.get("ts")
+    if ts is not None:
+        return ts
+    try:
+        return time.mktime(time.strptime(item.get("timestamp", ""), HISTORY_TIME_FORMAT))
+    except ValueError:
+        return None
+def parse_time_filter(value):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhd])", value.strip().lower())
+    if match:
+        return time.time() - float(match.group(1)) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+    return datetime.datetime.fromisoformat(value.strip()).timestamp()
+def parse_history_filter(text):
+    try:
+        tokens = shlex.split(text)
+    except ValueError:
+        tokens = text.split()
+    filters = {}
+    words = []
+    for token in tokens:
+        key, sep, value = token.partition(":")
+        key = key.lower()
+        if sep and value and key in ("action", "status", "device"):
+            filters[key] = value
+        elif sep and value and key in ("since", "until"):
+            filters[key] = parse_time_filter(value)
+        else:
+            words.append(token)
+    if words:
+        filters["search"] = " ".join(words)
+    return filters
+def summarize_history(counts, latencies):
+    summary = {}
+    for action, (count, failures) in sorted(counts.items()):
+        values = sorted(latencies.get(action, ()))
+        summary[action] = {
+            "count": count,
+            "failures": failures,
+            "failure_rate": failures / count if count else 0.0,
+            "p50": percentile(values, 50) if values else None,
+            "p90": percentile(values, 90) if values else None,
+            "p99": percentile(values, 99) if values else None
+        }
+    return summary
+class HistoryIndex:
+    FIELDS = ("action", "status", "device")
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built = False
+        self.clear()
+    def clear(self):
+        self.base = 0
+        self.times = array('d')
+        self.latencies = array('d')
+        self.columns = {field: array('I') for field in self.FIELDS}
+        self.lines = []
+        self.codes = {"": 0}
+        self.names = [""]
+        self.postings = {}
+        self.ordered = True
+        self.closed = deque()
+        self.current = 0
+    def code(self, value):
+        key = (value or "").lower()
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.names)
+            self.names.append(value)
+        return code
+    def add(self, item, line):
+        row = self.base + len(self.lines)
+        ts = item_time(item)
+        if ts is None:
+            ts = self.times[-1] if self.times else 0.0
+        if self.times and ts < self.times[-1]:
+            self.ordered = False
+        self.times.append(ts)
+        latency = item.get("latency_ms")
+        self.latencies.append(math.nan if latency is None else latency)
+        for field, column in self.columns.items():
+            code = self.code(item.get(field))
+            column.append(code)
+            self.postings.setdefault((field, code), array('q')).append(row)
+        self.lines.append(line)
+        self.current += 1
+    def close_file(self):
+        self.closed.append(self.current)
+        self.current = 0
+    def rotated(self, backups):
+        self.close_file()
+        while len(self.closed) > backups:
+            self.drop(self.closed.popleft())
+    def drop(self, count):
+        if not count:
+            return
+        del self.times[:count]
+        del self.latencies[:count]
+        for column in self.columns.values():
+            del column[:count]
+        del self.lines[:count]
+        self.base += count
+        for key, rows in list(self.postings.items()):
+            cut = bisect.bisect_left(rows, self.base)
+            if cut == len(rows):
+                del self.postings[key]
+            else:
+                del rows[:cut]
+    def rows(self, action=None, status=None, device=None, since=None, until=None, search=None):
+        wanted = {}
+        for field, value in (("action", action), ("status", status), ("device", device)):
+            if value is not None:
+                code = self.codes.get(value.lower())
+                if code is None:
+                    return
+                wanted[field] = code
+        if wanted:
+            candidates = min((self.postings.get(key, ()) for key in wanted.items()), key=len)
+        else:
+            candidates = range(self.base, self.base + len(self.lines))
+        low, high = 0, len(candidates)
+        if self.ordered:
+            key = lambda row: self.times[row - self.base]
+            if since is not None:
+                low = bisect.bisect_left(candidates, since, key=key)
+            if until is not None:
+                high = bisect.bisect_right(candidates, until, key=key)
+        needle = search.lower() if search else None
+        checks = [(self.columns[field], code) for field, code in wanted.items()]
+        for i in range(high - 1, low - 1, -1):
+            row = candidates[i] - self.base
+            if any(column[row] != code for column, code in checks):
+                continue
+            if not self.ordered and ((since is not None and self.times[row] < since) or (until is not None and self.times[row] > until)):
+                continue
+            if needle and needle not in self.lines[row].lower():
+                continue
+            yield row
+    def aggregate(self, rows):
+        counts = {}
+        latencies = {}
+        failures = {self.codes.get(status.lower()) for status in FAILURE_STATUSES}
+        started = self.codes.get("started")
+        actions = self.columns["action"]
+        statuses = self.columns["status"]
+        for row in rows:
+            status = statuses[row]
+            if status == started:
+                continue
+            action = self.names[actions[row]]
+            entry = counts.setdefault(action, [0, 0])
+            entry[0] += 1
+            if status in failures:
+                entry[1] += 1
+            latency = self.latencies[row]
+            if latency == latency:
+                latencies.setdefault(action, []).append(latency)
+        return counts, latencies
+class HistoryStore(ABC):
+    def __init__(self, path, flush_interval=0.5, batch_size=256):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.writer_loop, daemon=True)
+        self.thread.start()
+    def append(self, item):
+        self.queue.put(("append", item))
+    def clear(self):
+        self.queue.put(("clear", None))
+    def flush(self):
+        self.queue.put(("flush", None))
+        self.queue.join()
+    def close(self):
+        self.queue.put(("close", None))
+        self.thread.join(timeout=5)
+    def writer_loop(self):
+        while True:
+            op, item = self.queue.get()
+            handled = 1
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while op == "append":
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    op = None
+                    break
+                try:
+                    op, item = self.queue.get(timeout=remaining)
+                    handled += 1
+                except queue.Empty:
+                    op = None
+            try:
+                if batch:
+                    with METRICS.span("roku_history_write_seconds", backend=type(self).__name__):
+                        self.write_batch(batch)
+                        self.rotate_if_needed()
+                    METRICS.incr("roku_history_items_written_total", len(batch))
+                if op == "clear":
+                    self.do_clear()
+            except Exception as e:
+                print(f"Error writing command history: {e}")
+            for _ in range(handled):
+                self.queue.task_done()
+            if op == "close":
+                self.do_close()
+                return
+    @abstractmethod
+    def write_batch(self, items):
+        pass
+    def rotate_if_needed(self):
+        pass
+    @abstractmethod
+    def do_clear(self):
+        pass
+    def do_close(self):
+        pass
+    @abstractmethod
+    def load_tail(self, count):
+        pass
+    @abstractmethod
+    def iter_items(self):
+        pass
+    @abstractmethod
+    def query(self, limit=500, **filters):
+        pass
+    @abstractmethod
+    def summary(self, **filters):
+        pass
+    def is_empty(self):
+        return not self.load_tail(1)
+class JSONLinesHistoryStore(HistoryStore):
+    def __init__(self, path, max_bytes=5 * 1024 * 1024, max_age=None, backups=3, **kwargs):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.path = path
+        self.index = HistoryIndex()
+        self.recover()
+        self.started = self.first_item_time()
+        self.file = open(path, 'a', encoding='utf-8')
+        super().__init__(path, **kwargs)
+    def recover(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+            position = size
+            while position > 0:
+                step = min(4096, position)
+                position -= step
+                f.seek(position)
+                newline = f.read(step).rfind(b'\n')
+                if newline != -1:
+                    f.truncate(position + newline + 1)
+                    return
+            f.truncate(0)
+    def first_item_time(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                first = json.loads(f.readline())
+        except (OSError, ValueError):
+            return time.time()
+        return item_time(first) or time.time()
+    def write_batch(self, items):
+        lines = [json.dumps(item) for item in items]
+        with self.index.lock:
+            self.file.write(''.join(line + '\n' for line in lines))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            if self.index.built:
+                for item, line in zip(items, lines):
+                    self.index.add(item, line)
+    def rotate_if_needed(self):
+        too_big = self.max_bytes and self.file.tell() >= self.max_bytes
+        too_old = self.max_age and time.time() - self.started >= self.max_age
+        if not too_big and not too_old:
+            return
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.started = time.time()
+        with self.index.lock:
+            if self.index.built:
+                self.index.rotated(self.backups)
+    def do_clear(self):
+        self.file.close()
+        for i in range(1, self.backups + 1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.remove(f"{self.path}.{i}")
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.started = time.time()
+        with self.index.lock:
+            self.index.clear()
+    def do_close(self):
+        self.file.close()
+    def files(self):
+        paths = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)] + [self.path]
+        return [path for path in paths if os.path.exists(path)]
+    def read_lines(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    def iter_items(self):
+        for path in self.files():
+            yield from self.read_lines(path)
+    def build_index(self):
+        self.index.clear()
+        for path in self.files():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.index.add(json.loads(line), line.rstrip('\n'))
+                    except ValueError:
+                        continue
+            if path != self.path:
+                self.index.close_file()
+        self.index.built = True
+    def query(self, limit=500, **filters):
+        self.flush()
+        with self.index.lock:
+            if not self.index.built:
+                self.build_index()
+            lines = [self.index.lines[row] for row in islice(self.index.rows(**filters), limit)]
+        return [json.loads(line) for line in reversed(lines)]
+    def summary(self, **filters):
+        self.flush()
+        with self.index.lock:
+            if not self.index.built:
+                self.build_index()
+            counts, latencies = self.index.aggregate(self.index.rows(**filters))
+        return summarize_history(counts, latencies)
+    def load_tail(self, count):
+        items = []
+        for path in reversed(self.files()):
+            lines = []
+            with open(path, 'rb') as f:
+                position = f.seek(0, os.SEEK_END)
+                buffer = b''
+                while position > 0 and len(lines) < count - len(items):
+                    step = min(65536, position)
+                    position -= step
+                    f.seek(position)
+                    buffer = f.read(step) + buffer
+                    parts = buffer.split(b'\n')
+                    buffer = parts[0]
+                    lines = [line for line in parts[1:] if line.strip()] + lines
+                if position == 0 and buffer:
+                    lines.insert(0, buffer)
+            chunk = []
+            for line in lines:
+                try:
+                    chunk.append(json.loads(line))
+                except ValueError:
+                    continue
+            items = chunk[-(count - len(items)):] + items
+            if len(items) >= count:
+                break
+        return items
+class SQLiteHistoryStore(HistoryStore):
+    COLUMNS = (("ts", "REAL"), ("action", "TEXT COLLATE NOCASE"), ("status", "TEXT COLLATE NOCASE"), ("device", "TEXT COLLATE NOCASE"), ("op_id", "TEXT"), ("latency_ms", "REAL"))
+    INDEXES = (("history_ts", "ts"), ("history_action", "action, ts"), ("history_status", "status, ts"), ("history_device", "device, ts"), ("history_op", "op_id"))
+    def __init__(self, path, max_rows=None, max_age=None, **kwargs):
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL, data TEXT)")
+        self.migrate()
+        self.db.commit()
+        self.db_lock = threading.Lock()
+        super().__init__(path, **kwargs)
+    def migrate(self):
+        existing = {row[1] for row in self.db.execute("PRAGMA table_info(history)")}
+        missing = [(name, kind) for name, kind in self.COLUMNS if name not in existing]
+        for name, kind in missing:
+            self.db.execute(f"ALTER TABLE history ADD COLUMN {name} {kind}")
+        if missing:
+            rows = self.db.execute("SELECT id, created, data FROM history").fetchall()
+            updates = []
+            for row_id, created, data in rows:
+                try:
+                    item = json.loads(data)
+                except ValueError:
+                    continue
+                updates.append((item_time(item) or created, item.get("action"), item.get("status"), item.get("device"), item.get("op_id"), item.get("latency_ms"), row_id))
+            self.db.executemany("UPDATE history SET ts = ?, action = ?, status = ?, device = ?, op_id = ?, latency_ms = ? WHERE id = ?", updates)
+        for name, columns in self.INDEXES:
+            self.db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON history ({columns})")
+    def write_batch(self, items):
+        now = time.time()
+        rows = [(now, json.dumps(item), item_time(item) or now, item.get("action"), item.get("status"), item.get("device"), item.get("op_id"), item.get("latency_ms")) for item in items]
+        with self.db_lock, self.db:
+            self.db.executemany("INSERT INTO history (created, data, ts, action, status, device, op_id, latency_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    def rotate_if_needed(self):
+        with self.db_lock, self.db:
+            if self.max_rows:
+                self.db.execute("DELETE FROM history WHERE id <= (SELECT MAX(id) FROM history) - ?", (self.max_rows,))
+            if self.max_age:
+                self.db.execute("DELETE FROM history WHERE created < ?", (time.time() - self.max_age,))
+    def do_clear(self):
+        with self.db_lock, self.db:
+            self.db.execute("DELETE FROM history")
+    def do_close(self):
+        with self.db_lock:
+            self.db.close()
+    def iter_items(self):
+        last_id = 0
+        while True:
+            with self.db_lock:
+                rows = self.db.execute("SELECT id, data FROM history WHERE id > ? ORDER BY id LIMIT 1000", (last_id,)).fetchall()
+            if not rows:
+                return
+            for row_id, data in rows:
+                yield json.loads(data)
+            last_id = rows[-1][0]
+    def load_tail(self, count):
+        with self.db_lock:
+            rows = self.db.execute("SELECT data FROM history ORDER BY id DESC LIMIT ?", (count,)).fetchall()
+        return [json.loads(data) for data, in reversed(rows)]
+    def where(self, action=None, status=None, device=None, since=None, until=None, search=None):
+        clauses = []
+        params = []
+        for column, value in (("action", action), ("status", status), ("device", device)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts <= ?")
+            params.append(until)
+        if search:
+            clauses.append("data LIKE ? ESCAPE '\\'")
+            params.append("%" + re.sub(r"([%_\\])", r"\\\1", search) + "%")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+    def query(self, limit=500, **filters):
+        self.flush()
+        where, params = self.where(**filters)
+        with self.db_lock:
+            rows = self.db.execute(f"SELECT data FROM history{where} ORDER BY ts DESC, id DESC LIMIT ?", params + [-1 if limit is None else limit]).fetchall()
+        return [json.loads(data) for data, in reversed(rows)]
+    def summary(self, **filters):
+        self.flush()
+        where, params = self.where(**filters)
+        completed = (where + " AND" if where else " WHERE") + " status != 'Started'"
+        failed = ", ".join("?" for _ in FAILURE_STATUSES)
+        with self.db_lock:
+            totals = self.db.execute(f"SELECT action, COUNT(*), SUM(status IN ({failed})) FROM history{completed} GROUP BY action", list(FAILURE_STATUSES) + params).fetchall()
+            timings = self.db.execute(f"SELECT action, latency_ms FROM history{completed} AND latency_ms IS NOT NULL", params).fetchall()
+        latencies = {}
+        for action, latency in timings:
+            latencies.setdefault(action, []).append(latency)
+        return summarize_history({action: (count, failures) for action, count, failures in totals}, latencies)
+def open_history_store(path, **kwargs):
+    if os.path.splitext(path)[1].lower() in ('.db', '.sqlite', '.sqlite3'):
+        return SQLiteHistoryStore(path, **kwargs)
+    return JSONLinesHistoryStore(path, **kwargs)
+def format_latency(item):
+    latency = item.get("latency_ms")
+    return f"{latency:.0f} ms" if latency is not None else ""
+class HistoryRecord:
+    __slots__ = ('id', 'action', 'status', 'details', 'ts', 'op_id', 'device', 'latency_ms', 'ref')
+    def __init__(self, id, action, status, details="", ts=None, op_id=None, device=None, latency_ms=None, ref=None):
+        self.id = id
+        self.action = action
+        self.status = status
+        self.details = details
+        self.ts = ts
+        self.op_id = op_id
+        self.device = device
+        self.latency_ms = latency_ms
+        self.ref = ref
+    def __repr__(self):
+        return f"HistoryRecord({self.id!r}, {self.action!r}, {self.status!r}, {self.details!r})"
+    @property
+    def timestamp(self):
+        return time.strftime(HISTORY_TIME_FORMAT, time.localtime(self.ts)) if self.ts is not None else ""
+    def get(self, key, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+    def to_dict(self):
+        data = {"action": self.action, "status": self.status, "details": self.details, "timestamp": self.timestamp, "ts": self.ts, "op_id": self.op_id}
+        if self.device:
+            data["device"] = self.device
+        if self.ref is not None:
+            data["ref_offset"] = self.id - self.ref
+        if self.latency_ms is not None:
+            data["latency_ms"] = self.latency_ms
+        return data
+    @classmethod
+    def from_dict(cls, data, id=None):
+        offset = data.get("ref_offset")
+        ref = id - offset if id is not None and offset is not None and offset <= id else None
+        return cls(id, data.get("action"), data.get("status"), data.get("details", ""), item_time(data), data.get("op_id"), data.get("device"), data.get("latency_ms"), ref)
+class HistoryRingBuffer:
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.first_id = 0
+        self.next_id = 0
+        self.lock = threading.RLock()
+    def __len__(self):
+        return self.next_id - self.first_id
+    def __iter__(self):
+        return iter(self.range(self.first_id, self.next_id))
+    def append(self, record):
+        with self.lock:
+            record.id = self.next_id
+            slot = record.id % self.capacity
+            evicted = self.slots[slot] if len(self) == self.capacity else None
+            self.slots[slot] = record
+            self.next_id += 1
+            if evicted is not None:
+                self.first_id += 1
+            return evicted
+    def get(self, record_id):
+        with self.lock:
+            if record_id is not None and self.first_id <= record_id < self.next_id:
+                return self.slots[record_id % self.capacity]
+            return None
+    def range(self, start, end):
+        with self.lock:
+            start = max(start, self.first_id)
+            end = min(end, self.next_id)
+            return [self.slots[record_id % self.capacity] for record_id in range(start, end)]
+    def tail(self, count):
+        with self.lock:
+            return self.range(self.next_id - count, self.next_id)
+    def clear(self):
+        with self.lock:
+            self.slots = [None] * self.capacity
+            self.first_id = self.next_id
 class CommandHistory:
-    def __init__(self, history_file="command_history.json"):
+    def __init__(self, history_file="command_history.jsonl", store=None, max_items=1000):
         self.history_file = history_file
-        self.items = []
+        self.store = store or open_history_store(history_file)
+        self.max_items = max_items
+        self.items = HistoryRingBuffer(max_items)
+        self.started_at = {}
+        self.device = None
         self.load_history()
     def load_history(self):
-        if os.path.exists(self.history_file):
+        legacy_file = os.path.splitext(self.history_file)[0] + '.json'
+        if legacy_file != self.history_file and os.path.exists(legacy_file) and self.store.is_empty():
             try:
-                with open(self.history_file, 'r') as f:
-                    self.items = json.load(f)
-            except json.JSONDecodeError:
-                self.items = []
-        else:
-            self.items = []
+                with open(legacy_file, 'r') as f:
+                    for item in json.load(f):
+                        self.store.append(item)
+                self.store.flush()
+                os.replace(legacy_file, legacy_file + '.migrated')
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Could not migrate {legacy_file}: {e}")
+        for item in self.store.load_tail(self.max_items):
+            self.items.append(HistoryRecord.from_dict(item, self.items.next_id))
     def save_history(self):
-        with open(self.history_file, 'w') as f:
-            json.dump(self.items, f)
-    def add_item(self, action, status, details=""):
-        item = {
-            "action": action,
-            "status": status,
-            "details": details,
-            "timestamp": time.strftime("%m-%d-%Y %I:%M:%S %p")
-        }
-        self.items.append(item)
-        self.save_history()
-        return len(self.items) - 1
+        self.store.flush()
+    def add_item(self, action, status, details="", ref=None, latency=None, device=None):
+        with self.items.lock:
+            started = self.items.get(ref)
+            record = HistoryRecord(None, action, status, details, round(time.time(), 3), started.op_id if started else os.urandom(6).hex(),
+                                   device or (started.device if started else None) or self.device, ref=ref)
+            if ref is not None:
+                started_at = self.started_at.pop(ref, None)
+                if latency is None and started_at is not None:
+                    latency = time.perf_counter() - started_at
+            if latency is not None:
+                record.latency_ms = round(latency * 1000, 1)
+            evicted = self.items.append(record)
+            if evicted is not None:
+                self.started_at.pop(evicted.id, None)
+            if ref is None and status == "Started":
+                self.started_at[record.id] = time.perf_counter()
+            self.store.append(record.to_dict())
+        return record.id
+    def iter_all(self):
+        return self.store.iter_items()
+    def query(self, limit=500, **filters):
+        return self.store.query(limit, **filters)
+    def summary(self, **filters):
+        return self.store.summary(**filters)
     def clear_history(self):
-        self.items = []
-        self.save_history()
+        with self.items.lock:
+            self.items.clear()
+            self.started_at.clear()
+            self.store.clear()
+    def close(self):
+        self.store.close()
+def tokenize(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+def build_trie(phrases):
+    trie = {}
+    for phrase, value in phrases:
+        node = trie
+        for token in tokenize(phrase):
+            node = node.setdefault(token, {})
+        node.setdefault(None, value)
+    return trie
+def trie_match(trie, tokens, start):
+    node = trie
+    match = None
+    for end in range(start, len(tokens)):
+        node = node.get(tokens[end])
+        if node is None:
+            break
+        if None in node:
+            match = (node[None], end + 1)
+    return match
+class VoiceIntent:
+    def __init__(self, kind, value=None, count=1, name=None):
+        self.kind = kind
+        self.value = value
+        self.count = count
+        self.name = name
+    def __repr__(self):
+        return f"VoiceIntent({self.kind!r}, {self.value!r}, count={self.count}, name={self.name!r})"
+class AppNameIndex:
+    FALLBACK_APPS = [
+        ("837", "YouTube", ["youtube"]),
+        ("12", "Netflix", ["netflix"]),
+        ("2285", "Hulu", ["hulu"]),
+        ("13", "Amazon Prime Video", ["prime", "amazon", "amazon prime", "prime video"]),
+        ("291097", "Disney+", ["disney", "disney plus"]),
+        ("61322", "HBO Max", ["hbo", "hbo max"])
+    ]
+    def __init__(self, fuzzy_cache_size=256):
+        self.source = None
+        self.signature = None
+        self.trie = {}
+        self.names = {}
+        self.fuzzy_cache = {}
+        self.fuzzy_cache_size = fuzzy_cache_size
+    def rebuild(self, app_list):
+        if app_list is self.source and len(app_list) == len(self.signature):
+            return False
+        self.source = app_list
+        signature = tuple((app.id, app.name) for app in app_list)
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        self.fuzzy_cache = {}
+        phrases = []
+        self.names = {}
+        for app in app_list:
+            if app.name and tokenize(app.name):
+                phrases.append((app.name, (app.id, app.name)))
+                self.names.setdefault(" ".join(tokenize(app.name)), (app.id, app.name))
+        for app_id, name, aliases in self.FALLBACK_APPS:
+            for alias in aliases:
+                phrases.append((alias, (app_id, name)))
+                self.names.setdefault(alias, (app_id, name))
+        self.trie = build_trie(phrases)
+        return True
+    def exact(self, command):
+        tokens = tokenize(command)
+        return any(trie_match(self.trie, tokens, start) for start in range(len(tokens)))
+    def match(self, tokens, fuzzy_cutoff=0.75):
+        best = None
+        for start in range(len(tokens)):
+            found = trie_match(self.trie, tokens, start)
+            if found and (best is None or found[1] - start > best[1]):
+                best = (found[0], found[1] - start)
+        if best:
+            return best[0]
+        cache_key = tuple(tokens)
+        if cache_key in self.fuzzy_cache:
+            return self.fuzzy_cache[cache_key]
+        candidates = {}
+        for size in range(1, min(4, len(tokens)) + 1):
+            for start in range(len(tokens) - size + 1):
+                phrase = " ".join(tokens[start:start + size])
+                for close in difflib.get_close_matches(phrase, self.names, n=1, cutoff=fuzzy_cutoff):
+                    ratio = difflib.SequenceMatcher(None, phrase, close).ratio()
+                    if ratio > candidates.get(close, 0):
+                        candidates[close] = ratio
+        match = self.names[max(candidates, key=candidates.get)] if candidates else None
+        if len(self.fuzzy_cache) >= self.fuzzy_cache_size:
+            self.fuzzy_cache.pop(next(iter(self.fuzzy_cache)))
+        self.fuzzy_cache[cache_key] = match
+        return match
+class VoiceCommandMatcher:
+    KEY_PHRASES = {
+        "Up": ["up", "go up", "move up", "scroll up"],
+        "Down": ["down", "go down", "move down", "scroll down"],
+        "Left": ["left", "go left", "move left"],
+        "Right": ["right", "go right", "move right"],
+        "Select": ["select", "enter", "ok", "okay"],
+        "Back": ["back", "go back", "return"],
+        "Home": ["home", "menu", "go home"],
+        "Play": ["play", "resume", "pause"],
+        "Fwd": ["forward", "fast forward", "skip"],
+        "Rev": ["rewind", "skip back"],
+        "VolumeUp": ["volume up", "louder", "turn it up", "turn up the volume"],
+        "VolumeDown": ["volume down", "quieter", "softer", "turn it down", "turn down the volume"],
+        "VolumeMute": ["mute", "unmute"],
+        "Power": ["power", "turn off", "shutdown", "shut down", "power off"]
+    }
+    LAUNCH_WORDS = ("open", "launch", "start")
+    SINGLE_SHOT_KEYS = ("Select", "Back", "Home", "Play", "VolumeMute", "Power")
+    NUMBER_WORDS = {
+        "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+        "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+        "fifteen": 15, "twenty": 20, "once": 1, "twice": 2
+    }
+    MAX_REPEAT = 20
+    def __init__(self):
+        self.key_trie = build_trie((phrase, key) for key, phrases in self.KEY_PHRASES.items() for phrase in phrases)
+        self.apps = AppNameIndex()
+    def vocabulary(self, app_list=()):
+        words = set(self.LAUNCH_WORDS) | set(self.NUMBER_WORDS) | {"times"}
+        for phrases in self.KEY_PHRASES.values():
+            for phrase in phrases:
+                words.update(tokenize(phrase))
+        self.apps.rebuild(app_list)
+        for phrase in self.apps.names:
+            words.update(phrase.split())
+        return sorted(words)
+    def parse_count(self, tokens, index):
+        if index >= len(tokens) or tokens[index + 1:] not in ([], ["times"]):
+            return 1
+        token = tokens[index]
+        if token.isdigit():
+            count = int(token)
+        else:
+            count = self.NUMBER_WORDS.get(token)
+        if not count:
+            return 1
+        return max(1, min(count, self.MAX_REPEAT))
+    def match(self, command, app_list=()):
+        tokens = tokenize(command)
+        if any(token in self.LAUNCH_WORDS for token in tokens):
+            self.apps.rebuild(app_list)
+            start = next(i for i, token in enumerate(tokens) if token in self.LAUNCH_WORDS)
+            app = self.apps.match(tokens[start + 1:])
+            if app:
+                return VoiceIntent("launch", app[0], name=app[1])
+            return VoiceIntent("unknown_app")
+        for start in range(len(tokens)):
+            found = trie_match(self.key_trie, tokens, start)
+            if found:
+                key, end = found
+                return VoiceIntent("key", key, self.parse_count(tokens, end))
+        return VoiceIntent("unrecognized")
+class GoogleSpeechBackend:
+    name = "Google (online)"
+    def __init__(self, listen_timeout=5, phrase_time_limit=5):
+        self.listen_timeout = listen_timeout
+        self.phrase_time_limit = phrase_time_limit
+    def set_grammar(self, phrases):
+        pass
+    def run(self, voice, source):
+        while voice.listening:
+            try:
+                audio = voice.recognizer.listen(source, timeout=self.listen_timeout, phrase_time_limit=self.phrase_time_limit)
+            except sr.WaitTimeoutError:
+                continue
+            utterance_end = time.perf_counter()
+            try:
+                text = voice.recognizer.recognize_google(audio)
+                if text:
+                    voice.emit(text, True, utterance_end)
+            except sr.UnknownValueError:
+                pass
+            except sr.RequestError as e:
+                print(f"Could not request results; {e}")
+class VoskSpeechBackend:
+    name = "Vosk (offline)"
+    def __init__(self, model_path=None):
+        import vosk
+        self.vosk = vosk
+        self.model_path = model_path or os.environ.get("ROKU_VOSK_MODEL", "vosk-model")
+        self.model = vosk.Model(self.model_path)
+        self.grammar = None
+        self.recognizer = None
+    @classmethod
+    def available(cls, model_path=None):
+        if importlib.util.find_spec("vosk") is None:
+            return False
+        return os.path.isdir(model_path or os.environ.get("ROKU_VOSK_MODEL", "vosk-model"))
+    def set_grammar(self, phrases):
+        self.grammar = list(phrases) + ["[unk]"] if phrases else None
+        self.recognizer = None
+    def run(self, voice, source):
+        partial = ""
+        while voice.listening:
+            if self.recognizer is None:
+                if self.grammar:
+                    self.recognizer = self.vosk.KaldiRecognizer(self.model, source.SAMPLE_RATE, json.dumps(self.grammar))
+                else:
+                    self.recognizer = self.vosk.KaldiRecognizer(self.model, source.SAMPLE_RATE)
+            data = source.stream.read(source.CHUNK)
+            if self.recognizer.AcceptWaveform(data):
+                utterance_end = time.perf_counter()
+                text = json.loads(self.recognizer.Result()).get("text", "").replace("[unk]", "").strip()
+                partial = ""
+                if text:
+                    voice.emit(text, True, utterance_end)
+            else:
+                text = json.loads(self.recognizer.PartialResult()).get("partial", "").replace("[unk]", "").strip()
+                if text and text != partial:
+                    partial = text
+                    voice.emit(text, False, time.perf_counter())
 class VoiceRecognizer:
-    def __init__(self, callback):
+    def __init__(self, callback, backend=None, partial_callback=None):
+        load_voice_modules()
         self.recognizer = sr.Recognizer()
         self.callback = callback
+        self.partial_callback = partial_callback
+        if backend is None:
+            backend = VoskSpeechBackend() if VoskSpeechBackend.available() else GoogleSpeechBackend()
+        self.backend = backend
         self.listening = False
         self.thread = None
+        self.calibrated = False
+        self.partial_handled = False
+        self.latencies = deque(maxlen=100)
+        self.last_latency = None
+    def set_grammar(self, phrases):
+        self.backend.set_grammar(phrases)
     def start_listening(self):
         if self.listening:
             return
@@ -151,20 +2832,30 @@ class VoiceRecognizer:
         if self.thread:
             self.thread.join(timeout=1)
             self.thread = None
+    def emit(self, text, final, utterance_end):
+        text = text.lower()
+        if not final:
+            if self.partial_callback and not self.partial_handled and self.partial_callback(text):
+                self.partial_handled = True
+                self.record_latency(utterance_end)
+            return
+        handled, self.partial_handled = self.partial_handled, False
+        if not handled:
+            self.record_latency(utterance_end)
+        self.callback(text)
+    def record_latency(self, utterance_end):
+        self.last_latency = time.perf_counter() - utterance_end
+        self.latencies.append(self.last_latency)
+    def average_latency(self):
+        return sum(self.latencies) / len(self.latencies) if self.latencies else None
     def listen_loop(self):
         while self.listening:
             try:
                 with sr.Microphone() as source:
-                    self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                    audio = self.recognizer.listen(source, timeout=5, phrase_time_limit=5)
-                try:
-                    text = self.recognizer.recognize_google(audio)
-                    if text:
-                        self.callback(text.lower())
-                except sr.UnknownValueError:
-                    pass
-                except sr.RequestError as e:
-                    print(f"Could not request results; {e}")
+                    if not self.calibrated:
+                        self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                        self.calibrated = True
+                    self.backend.run(self, source)
             except Exception as e:
                 print(f"Error in voice recognition: {e}")
                 time.sleep(1)
@@ -204,7 +2895,8 @@ class ThemeManager:
         return self.dark_mode
     def apply_theme(self, theme):
         style = ttk.Style()
-        style.theme_use('default')
+        if style.theme_use() != 'default':
+            style.theme_use('default')
         style.configure('TFrame', background=theme['bg'])
         style.configure('TLabel', background=theme['bg'], foreground=theme['fg'])
         style.configure('TButton', background=theme['button_bg'])
@@ -220,19 +2912,178 @@ class ThemeManager:
                  foreground=[('selected', theme['select_fg'])])
         style.configure('TCombobox', background=theme['entry_bg'], fieldbackground=theme['entry_bg'])
         self.root.configure(background=theme['bg'])
+class AppLauncher:
+    TILE_WIDTH = 124
+    TILE_HEIGHT = 112
+    ICON_WIDTH = 108
+    ICON_HEIGHT = 81
+    def __init__(self, ui, roku, icon_cache, on_launch, apps=None, columns=5):
+        self.ui = ui
+        self.root = root = ui.root
+        self.roku = roku
+        self.icon_cache = icon_cache
+        self.on_launch = on_launch
+        self.apps = list(apps if apps is not None else roku.app_list)
+        self.columns = columns
+        self.images = {}
+        self.image_items = {}
+        self.window = tk.Toplevel(root)
+        self.window.title("App Launcher")
+        self.window.geometry(f"{self.TILE_WIDTH * columns + 30}x{self.TILE_HEIGHT * 4 + 10}")
+        self.canvas = tk.Canvas(self.window, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(self.window, orient=tk.VERTICAL, command=self.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        rows = math.ceil(len(self.apps) / columns)
+        self.canvas.configure(scrollregion=(0, 0, self.TILE_WIDTH * columns, self.TILE_HEIGHT * rows))
+        for index, app in enumerate(self.apps):
+            x, y = self.tile_origin(index)
+            self.canvas.create_rectangle(x + 4, y + 4, x + self.TILE_WIDTH - 4, y + self.TILE_HEIGHT - 4, outline="#c0c0c0")
+            self.image_items[app.id] = self.canvas.create_image(x + self.TILE_WIDTH // 2, y + 8 + self.ICON_HEIGHT // 2)
+            self.canvas.create_text(x + self.TILE_WIDTH // 2, y + self.TILE_HEIGHT - 14, text=app.name, width=self.TILE_WIDTH - 12)
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<Configure>", lambda e: self.schedule_render())
+        self.canvas.bind("<MouseWheel>", lambda e: self.yview("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+        self.icon_cache.fetch_missing(roku, self.apps, lambda app_id, data: self.schedule_render())
+        self.schedule_render()
+    def tile_origin(self, index):
+        row, col = divmod(index, self.columns)
+        return col * self.TILE_WIDTH, row * self.TILE_HEIGHT
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.schedule_render()
+    def schedule_render(self):
+        self.ui.update(("launcher", id(self)), self.render_visible)
+    def visible_range(self):
+        top = self.canvas.canvasy(0)
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        first = int(top // self.TILE_HEIGHT) * self.columns
+        last = (int(bottom // self.TILE_HEIGHT) + 1) * self.columns
+        return max(first, 0), min(last, len(self.apps))
+    def render_visible(self):
+        if not self.window.winfo_exists():
+            return
+        first, last = self.visible_range()
+        for app in self.apps[first:last]:
+            if app.id in self.images:
+                continue
+            data = self.icon_cache.get(app.id, app.version)
+            if data is None:
+                continue
+            image = self.decode(data)
+            if image is not None:
+                self.images[app.id] = image
+                self.canvas.itemconfigure(self.image_items[app.id], image=image)
+    def decode(self, data):
+        try:
+            image = tk.PhotoImage(data=base64.b64encode(data))
+        except tk.TclError:
+            return None
+        factor = max(math.ceil(image.width() / self.ICON_WIDTH), math.ceil(image.height() / self.ICON_HEIGHT), 1)
+        return image.subsample(factor) if factor > 1 else image
+    def on_click(self, event):
+        col = int(self.canvas.canvasx(event.x) // self.TILE_WIDTH)
+        row = int(self.canvas.canvasy(event.y) // self.TILE_HEIGHT)
+        index = row * self.columns + col
+        if col < self.columns and 0 <= index < len(self.apps):
+            app = self.apps[index]
+            self.on_launch(app.id, app.name)
 class RokuGUI:
-    def __init__(self, root):
+    HISTORY_PAGE_SIZE = 200
+    KEYBOARD_KEYS = {"Up": "Up", "Down": "Down", "Left": "Left", "Right": "Right", "Return": "Select", "BackSpace": "Back"}
+    TEXT_WIDGETS = ("Entry", "TEntry", "TCombobox", "Text", "Treeview")
+    def __init__(self, root, profiler=None, on_ready=None):
         self.root = root
+        self.profiler = profiler or StartupProfiler()
+        self.on_ready = on_ready
+        start = time.perf_counter()
         self.root.title("ROKU CONTROL !!!!")
         self.root.geometry("800x600")
         self.root.minsize(1200, 700)
         self.roku = None
+        self.registry = DeviceRegistry()
+        self.notify_listener = SSDPNotifyListener(self.on_device_notify)
+        self.devices = {}
+        self.fleet_groups = FleetGroups()
+        self.fleets = {}
+        self.broadcast_var = tk.BooleanVar(value=False)
+        self.aroku = None
+        self.ui = UIUpdateBus(self.root)
+        self.bridge = TkAsyncBridge(self.root, self.ui)
+        self.dispatcher = None
+        self.coalesce_var = tk.BooleanVar(value=False)
+        self.held_key = None
+        self.keys_down = set()
+        self.key_releases = {}
+        self.text_cancel = None
+        self.state_monitor = None
+        self.icon_cache = IconCache()
+        self.launcher = None
+        self.diagnostics = None
+        self.health_listener = None
+        self.macro_store = MacroStore()
+        self.macro_recorder = MacroRecorder()
+        self.macro_cancel = None
+        self.macro_scheduler = MacroScheduler(self.macro_store, self.fleet_groups, self.on_scheduled_macro)
         self.history = CommandHistory()
+        self.history_rendered = 0
+        self.history_page = 0
+        self.history_filter = None
+        self.history_summary = None
         self.voice = None
+        self.voice_prewarm = None
+        self.voice_matcher = VoiceCommandMatcher()
+        self.voice_partial = None
         self.voice_button_var = tk.StringVar(value="Start Voice Control")
-        self.theme_manager = ThemeManager(self.root)
         self.dark_mode_var = tk.StringVar(value="🌙 Dark Mode")
-        self.setup_ui()
+        self.profiler.record("state", start, time.perf_counter())
+        with self.profiler.phase("theme"):
+            self.theme_manager = ThemeManager(self.root)
+        with self.profiler.phase("layout"):
+            self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.bind("<KeyPress>", self.on_key_press)
+        self.root.bind("<KeyRelease>", self.on_key_release)
+        self.root.bind("<FocusOut>", lambda event: self.root.after(10, self.check_key_focus))
+        self.startup_stages = deque([
+            ("history", self.render_history),
+            ("devices", self.load_known_devices),
+            ("scheduler", self.macro_scheduler.start),
+            ("ssdp", lambda: self.bridge.run(self.notify_listener.start)),
+            ("voice", self.start_voice_prewarm)
+        ])
+        self.startup_started = False
+        self.root.bind("<Expose>", self.on_first_paint)
+        self.root.after(1000, self.on_first_paint)
+    def on_first_paint(self, event=None):
+        if self.startup_started:
+            return
+        self.startup_started = True
+        self.root.unbind("<Expose>")
+        self.profiler.mark("first_paint" if event else "startup_timeout")
+        self.root.after(1, self.run_startup_stage)
+    def run_startup_stage(self):
+        if not self.startup_stages:
+            self.profiler.mark("ready")
+            if self.on_ready:
+                self.on_ready()
+            return
+        name, stage = self.startup_stages.popleft()
+        with self.profiler.phase(name):
+            stage()
+        self.root.after(1, self.run_startup_stage)
+    def start_voice_prewarm(self):
+        def prewarm():
+            with self.profiler.phase("voice_import"):
+                try:
+                    load_voice_modules()
+                except ImportError:
+                    pass
+        self.voice_prewarm = threading.Thread(target=prewarm, daemon=True)
+        self.voice_prewarm.start()
     def setup_ui(self):
         main_frame = ttk.Frame(self.root, padding="10")
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -240,6 +3091,7 @@ class RokuGUI:
         top_frame.pack(fill=tk.X, pady=5)
         theme_button = ttk.Button(top_frame, textvariable=self.dark_mode_var, command=self.toggle_dark_mode)
         theme_button.pack(side=tk.RIGHT, padx=5)
+        ttk.Button(top_frame, text="Diagnostics", command=self.open_diagnostics).pack(side=tk.RIGHT, padx=5)
         control_panel = ttk.Frame(main_frame)
         control_panel.pack(fill=tk.X, pady=5)
         conn_frame = ttk.LabelFrame(control_panel, text="Roku Connection", padding="10")
@@ -249,6 +3101,21 @@ class RokuGUI:
         ttk.Entry(conn_frame, textvariable=self.ip_var, width=15).grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
         ttk.Button(conn_frame, text="Connect", command=self.connect_roku).grid(row=0, column=2, padx=5, pady=5)
         ttk.Button(conn_frame, text="Auto-Discover", command=self.auto_discover).grid(row=0, column=3, padx=5, pady=5)
+        ttk.Button(conn_frame, text="Wake", command=self.wake_roku).grid(row=0, column=4, padx=5, pady=5)
+        self.health_var = tk.StringVar(value="Health: not connected")
+        ttk.Label(conn_frame, textvariable=self.health_var).grid(row=2, column=0, columnspan=5, padx=5, sticky=tk.W)
+        ttk.Label(conn_frame, text="Devices:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
+        self.device_var = tk.StringVar()
+        self.device_dropdown = ttk.Combobox(conn_frame, textvariable=self.device_var, state="readonly", width=40)
+        self.device_dropdown.grid(row=1, column=1, columnspan=3, padx=5, pady=5, sticky=tk.W)
+        self.device_dropdown.bind("<<ComboboxSelected>>", self.select_device)
+        fleet_frame = ttk.LabelFrame(control_panel, text="Fleet", padding="10")
+        fleet_frame.pack(side=tk.LEFT, fill=tk.X, padx=(10, 0))
+        self.fleet_group_var = tk.StringVar()
+        self.fleet_dropdown = ttk.Combobox(fleet_frame, textvariable=self.fleet_group_var, state="readonly", values=self.fleet_groups.names(), width=15)
+        self.fleet_dropdown.grid(row=0, column=0, padx=5, pady=5)
+        ttk.Button(fleet_frame, text="Save Devices as Group", command=self.save_fleet_group).grid(row=0, column=1, padx=5, pady=5)
+        ttk.Checkbutton(fleet_frame, text="Broadcast to group", variable=self.broadcast_var).grid(row=1, column=0, columnspan=2, padx=5, sticky=tk.W)
         voice_frame = ttk.LabelFrame(control_panel, text="Voice Control", padding="10")
         voice_frame.pack(side=tk.RIGHT, fill=tk.X, padx=(10, 0))
         self.voice_status_var = tk.StringVar(value="Voice control inactive")
@@ -271,6 +3138,30 @@ class RokuGUI:
         self.status_var = tk.StringVar(value="Not connected")
         status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         status_bar.pack(fill=tk.X, side=tk.BOTTOM, pady=5)
+    def on_close(self):
+        self.ui.stop()
+        for cancel in (self.text_cancel, self.macro_cancel):
+            if cancel:
+                cancel.set()
+        if self.dispatcher:
+            self.dispatcher.stop()
+        if self.state_monitor:
+            self.state_monitor.stop()
+        if self.voice:
+            self.voice.stop_listening()
+        self.macro_scheduler.stop()
+        self.notify_listener.stop()
+        for fleet in self.fleets.values():
+            fleet.close()
+        if self.aroku:
+            try:
+                self.bridge.submit(self.aroku.close()).result(timeout=1)
+            except Exception as e:
+                print(f"Error closing async connections: {e}")
+        self.bridge.stop()
+        self.history.close()
+        RokuController.close_sessions()
+        self.root.destroy()
     def setup_tv_info_ui(self, parent):
         self.tv_info_vars = {
             'model_name': tk.StringVar(value="Model: Not connected"),
@@ -278,7 +3169,10 @@ class RokuGUI:
             'software_version': tk.StringVar(value="Software: Not connected"),
             'network_type': tk.StringVar(value="Network: Not connected"),
             'screen_size': tk.StringVar(value="Screen Size: Not connected"),
-            'uptime': tk.StringVar(value="Uptime: Not connected")
+            'uptime': tk.StringVar(value="Uptime: Not connected"),
+            'active_app': tk.StringVar(value="App: Not connected"),
+            'player_state': tk.StringVar(value="Player: Not connected"),
+            'power_mode': tk.StringVar(value="Power: Not connected")
         }
         info_frame = ttk.Frame(parent)
         info_frame.pack(fill=tk.X, expand=True)
@@ -288,36 +3182,94 @@ class RokuGUI:
             ttk.Label(info_frame, textvariable=var).grid(row=row, column=col, padx=10, pady=5, sticky=tk.W)
         ttk.Button(parent, text="Refresh TV Info", command=self.refresh_tv_info).pack(pady=5)
     def refresh_tv_info(self):
-        if not self.roku:
+        if not self.aroku:
             return
         self.status_var.set("Refreshing TV information...")
-        self.history.add_item("Refresh TV Info", "Started", "Retrieving device information")
+        ref = self.history.add_item("Refresh TV Info", "Started", "Retrieving device information")
         self.refresh_history()
-        def info_thread():
-            try:
-                if self.roku.get_device_info():
-                    info = self.roku.device_info
-                    self.root.after(0, lambda: self.tv_info_vars['model_name'].set(f"Model: {info.get('model-name', 'Unknown')}"))
-                    self.root.after(0, lambda: self.tv_info_vars['serial_number'].set(f"Serial: {info.get('serial-number', 'Unknown')}"))
-                    self.root.after(0, lambda: self.tv_info_vars['software_version'].set(f"Software: {info.get('software-version', 'Unknown')}"))
-                    self.root.after(0, lambda: self.tv_info_vars['network_type'].set(f"Network: {info.get('network-type', 'Unknown')}"))
-                    self.root.after(0, lambda: self.tv_info_vars['screen_size'].set(f"Screen Size: {info.get('screen-size', 'Unknown')}"))
-                    uptime_seconds = int(info.get('uptime', 0))
-                    hours, remainder = divmod(uptime_seconds, 3600)
-                    minutes, seconds = divmod(remainder, 60)
-                    uptime_str = f"{hours}h {minutes}m {seconds}s"
-                    self.root.after(0, lambda: self.tv_info_vars['uptime'].set(f"Uptime: {uptime_str}"))
-                    self.root.after(0, lambda: self.status_var.set("TV information updated"))
-                    self.root.after(0, lambda: self.history.add_item("Refresh TV Info", "Success", "Device information updated"))
-                else:
-                    self.root.after(0, lambda: self.status_var.set("Failed to get TV information"))
-                    self.root.after(0, lambda: self.history.add_item("Refresh TV Info", "Failed", "Could not retrieve device information"))
-            except Exception as e:
-                self.root.after(0, lambda: self.status_var.set(f"Error getting TV info: {str(e)}"))
-                self.root.after(0, lambda: self.history.add_item("Refresh TV Info", "Error", str(e)))
-            finally:
-                self.root.after(0, self.refresh_history)
-        threading.Thread(target=info_thread, daemon=True).start()
+        def on_info(ok):
+            if ok:
+                self.show_tv_info(self.aroku.device_info)
+                self.status_var.set("TV information updated")
+                self.history.add_item("Refresh TV Info", "Success", "Device information updated", ref)
+            else:
+                self.status_var.set("Failed to get TV information")
+                self.history.add_item("Refresh TV Info", "Failed", "Could not retrieve device information", ref)
+            self.refresh_history()
+        def on_error(e):
+            self.status_var.set(f"Error getting TV info: {str(e)}")
+            self.history.add_item("Refresh TV Info", "Error", str(e), ref)
+            self.refresh_history()
+        self.bridge.submit(self.aroku.get_device_info(), on_info, on_error)
+    def start_state_monitor(self, roku):
+        if self.state_monitor:
+            self.state_monitor.stop()
+        self.state_monitor = DeviceStateMonitor(roku, lambda changes: self.ui.call(self.apply_state_changes, roku, changes)).start()
+    def apply_state_changes(self, roku, changes):
+        if roku is not self.roku:
+            return
+        with METRICS.span("roku_tk_refresh_seconds", view="state"):
+            self.show_state_changes(roku, changes)
+    def show_state_changes(self, roku, changes):
+        if any(key in changes for key in ('model-name', 'serial-number', 'software-version', 'network-type', 'screen-size', 'uptime')):
+            self.show_tv_info(roku.device_info)
+        if 'active_app' in changes:
+            self.tv_info_vars['active_app'].set(f"App: {changes['active_app']}")
+        if 'player_state' in changes or 'position' in changes:
+            snapshot = self.state_monitor.snapshot
+            position = snapshot.get('position')
+            duration = snapshot.get('duration')
+            player = (snapshot.get('player_state') or 'Unknown').capitalize()
+            if position is not None and snapshot.get('player_state') in ('play', 'pause'):
+                player += f" {position // 60000}:{position // 1000 % 60:02d}"
+                if duration:
+                    player += f" / {duration // 60000}:{duration // 1000 % 60:02d}"
+            self.tv_info_vars['player_state'].set(f"Player: {player}")
+        if 'power-mode' in changes:
+            self.tv_info_vars['power_mode'].set(f"Power: {changes['power-mode']}")
+        if 'reachable' in changes and not changes['reachable']:
+            self.status_var.set(f"Roku at {roku.ip_address} is not responding")
+    def show_tv_info(self, info):
+        self.tv_info_vars['model_name'].set(f"Model: {info.model_name or 'Unknown'}")
+        self.tv_info_vars['serial_number'].set(f"Serial: {info.serial_number or 'Unknown'}")
+        self.tv_info_vars['software_version'].set(f"Software: {info.software_version or 'Unknown'}")
+        self.tv_info_vars['network_type'].set(f"Network: {info.network_type or 'Unknown'}")
+        self.tv_info_vars['screen_size'].set(f"Screen Size: {info.screen_size or 'Unknown'}")
+        hours, remainder = divmod(info.uptime or 0, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        self.tv_info_vars['uptime'].set(f"Uptime: {hours}h {minutes}m {seconds}s")
+        self.tv_info_vars['power_mode'].set(f"Power: {info.power_mode or 'Unknown'}")
+    def open_diagnostics(self):
+        if self.diagnostics and self.diagnostics.winfo_exists():
+            self.diagnostics.lift()
+            return
+        self.diagnostics = tk.Toplevel(self.root)
+        self.diagnostics.title("Diagnostics")
+        self.diagnostics.geometry("760x360")
+        columns = ('metric', 'labels', 'count', 'mean', 'p50', 'p95', 'p99')
+        tree = ttk.Treeview(self.diagnostics, columns=columns, show='headings')
+        for column, width in zip(columns, (200, 260, 60, 60, 60, 60, 60)):
+            tree.heading(column, text=column if column in ('p50', 'p95', 'p99') else column.capitalize())
+            tree.column(column, width=width, anchor=tk.W if column in ('metric', 'labels') else tk.E)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        buttons = ttk.Frame(self.diagnostics)
+        buttons.pack(fill=tk.X, padx=5, pady=(0, 5))
+        ttk.Button(buttons, text="Reset", command=METRICS.reset).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Copy as Prometheus", command=self.copy_metrics).pack(side=tk.LEFT, padx=2)
+        def refresh():
+            if not tree.winfo_exists():
+                return
+            rows = METRICS.snapshot()
+            tree.delete(*tree.get_children())
+            for name, labels, count, mean, p50, p95, p99 in rows:
+                tree.insert('', 'end', values=(name, ", ".join(f"{key}={value}" for key, value in labels.items()), count,
+                                               *(f"{value * 1000:.1f} ms" for value in (mean, p50, p95, p99))))
+            self.diagnostics.after(1000, refresh)
+        refresh()
+    def copy_metrics(self):
+        self.root.clipboard_clear()
+        self.root.clipboard_append(METRICS.to_prometheus())
+        self.status_var.set("Copied metrics to the clipboard")
     def toggle_dark_mode(self):
         is_dark = self.theme_manager.toggle_theme()
         if is_dark:
@@ -325,26 +3277,41 @@ class RokuGUI:
         else:
             self.dark_mode_var.set("🌙 Dark Mode")
     def setup_log_ui(self, parent):
+        filter_frame = ttk.Frame(parent)
+        filter_frame.pack(fill=tk.X)
+        ttk.Label(filter_frame, text="Filter:").pack(side=tk.LEFT, padx=2)
+        self.history_filter_var = tk.StringVar()
+        filter_entry = ttk.Entry(filter_frame, textvariable=self.history_filter_var)
+        filter_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2)
+        filter_entry.bind("<Return>", lambda event: self.apply_history_filter())
+        ttk.Button(filter_frame, text="Search", command=self.apply_history_filter).pack(side=tk.LEFT, padx=2)
+        ttk.Button(filter_frame, text="Reset", command=self.reset_history_filter).pack(side=tk.LEFT, padx=2)
+        ttk.Button(filter_frame, text="Summary...", command=self.open_history_summary).pack(side=tk.LEFT, padx=2)
         buttons_frame = ttk.Frame(parent)
         buttons_frame.pack(fill=tk.X, pady=5)
         ttk.Button(buttons_frame, text="Clear History", command=self.clear_history).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(buttons_frame, text="◄ Older", command=self.older_history_page).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons_frame, text="Newer ►", command=self.newer_history_page).pack(side=tk.LEFT, padx=2)
+        self.history_page_var = tk.StringVar()
+        ttk.Label(buttons_frame, textvariable=self.history_page_var).pack(side=tk.LEFT, padx=5)
         list_frame = ttk.Frame(parent)
         list_frame.pack(fill=tk.BOTH, expand=True, pady=5)
-        columns = ('timestamp', 'action', 'status', 'details')
+        columns = ('timestamp', 'action', 'status', 'latency', 'details')
         self.history_tree = ttk.Treeview(list_frame, columns=columns, show='headings')
         self.history_tree.heading('timestamp', text='Time')
         self.history_tree.heading('action', text='Action')
         self.history_tree.heading('status', text='Status')
+        self.history_tree.heading('latency', text='Latency')
         self.history_tree.heading('details', text='Details')
         self.history_tree.column('timestamp', width=150)
         self.history_tree.column('action', width=100)
         self.history_tree.column('status', width=80)
+        self.history_tree.column('latency', width=70)
         self.history_tree.column('details', width=200)
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.history_tree.yview)
         self.history_tree.configure(yscroll=scrollbar.set)
         self.history_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.refresh_history()
     def setup_controls_ui(self, parent):
         remote_frame = ttk.Frame(parent)
         remote_frame.pack(fill=tk.BOTH, expand=True)
@@ -355,11 +3322,11 @@ class RokuGUI:
         ttk.Button(power_home_frame, text="Back", command=lambda: self.send_key("Back")).pack(side=tk.LEFT, padx=5)
         nav_frame = ttk.Frame(remote_frame)
         nav_frame.pack(pady=10)
-        ttk.Button(nav_frame, text="▲", width=3, command=lambda: self.send_key("Up")).grid(row=0, column=1, pady=2)
-        ttk.Button(nav_frame, text="◄", width=3, command=lambda: self.send_key("Left")).grid(row=1, column=0, padx=2)
+        self.hold_button(nav_frame, "▲", "Up", width=3).grid(row=0, column=1, pady=2)
+        self.hold_button(nav_frame, "◄", "Left", width=3).grid(row=1, column=0, padx=2)
         ttk.Button(nav_frame, text="OK", width=3, command=lambda: self.send_key("Select")).grid(row=1, column=1, padx=2)
-        ttk.Button(nav_frame, text="►", width=3, command=lambda: self.send_key("Right")).grid(row=1, column=2, padx=2)
-        ttk.Button(nav_frame, text="▼", width=3, command=lambda: self.send_key("Down")).grid(row=2, column=1, pady=2)
+        self.hold_button(nav_frame, "►", "Right", width=3).grid(row=1, column=2, padx=2)
+        self.hold_button(nav_frame, "▼", "Down", width=3).grid(row=2, column=1, pady=2)
         playback_frame = ttk.Frame(remote_frame)
         playback_frame.pack(fill=tk.X, pady=5)
         ttk.Button(playback_frame, text="⏮", width=3, command=lambda: self.send_key("Rev")).pack(side=tk.LEFT, padx=2)
@@ -367,54 +3334,313 @@ class RokuGUI:
         ttk.Button(playback_frame, text="⏭", width=3, command=lambda: self.send_key("Fwd")).pack(side=tk.LEFT, padx=2)
         vol_frame = ttk.Frame(remote_frame)
         vol_frame.pack(fill=tk.X, pady=5)
-        ttk.Button(vol_frame, text="Vol+", command=lambda: self.send_key("VolumeUp")).pack(side=tk.LEFT, padx=5)
-        ttk.Button(vol_frame, text="Vol-", command=lambda: self.send_key("VolumeDown")).pack(side=tk.LEFT, padx=5)
+        self.hold_button(vol_frame, "Vol+", "VolumeUp").pack(side=tk.LEFT, padx=5)
+        self.hold_button(vol_frame, "Vol-", "VolumeDown").pack(side=tk.LEFT, padx=5)
         ttk.Button(vol_frame, text="Mute", command=lambda: self.send_key("VolumeMute")).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(remote_frame, text="Merge repeated navigation into holds", variable=self.coalesce_var, command=self.toggle_coalesce).pack(anchor=tk.W, pady=5)
+        text_frame = ttk.LabelFrame(remote_frame, text="Text Entry")
+        text_frame.pack(fill=tk.X, pady=5)
+        self.text_entry_var = tk.StringVar()
+        text_entry = ttk.Entry(text_frame, textvariable=self.text_entry_var)
+        text_entry.pack(fill=tk.X, padx=5, pady=5)
+        text_entry.bind("<Return>", lambda event: self.send_text())
+        text_buttons = ttk.Frame(text_frame)
+        text_buttons.pack(fill=tk.X, padx=5)
+        ttk.Button(text_buttons, text="Send Text", command=self.send_text).pack(side=tk.LEFT, padx=2)
+        ttk.Button(text_buttons, text="Cancel", command=self.cancel_text).pack(side=tk.LEFT, padx=2)
+        self.text_progress = ttk.Progressbar(text_frame, mode="determinate")
+        self.text_progress.pack(fill=tk.X, padx=5, pady=5)
+        macro_frame = ttk.LabelFrame(remote_frame, text="Macros")
+        macro_frame.pack(fill=tk.X, pady=5)
+        self.macro_var = tk.StringVar()
+        self.macro_dropdown = ttk.Combobox(macro_frame, textvariable=self.macro_var, values=self.macro_store.names())
+        self.macro_dropdown.pack(fill=tk.X, padx=5, pady=5)
+        macro_buttons = ttk.Frame(macro_frame)
+        macro_buttons.pack(fill=tk.X, padx=5, pady=(0, 5))
+        self.record_button_var = tk.StringVar(value="Record")
+        ttk.Button(macro_buttons, textvariable=self.record_button_var, command=self.toggle_macro_recording).pack(side=tk.LEFT, padx=2)
+        ttk.Button(macro_buttons, text="Play", command=self.play_macro).pack(side=tk.LEFT, padx=2)
+        ttk.Button(macro_buttons, text="Stop", command=self.stop_macro).pack(side=tk.LEFT, padx=2)
+        ttk.Button(macro_buttons, text="Schedule...", command=self.schedule_macro).pack(side=tk.LEFT, padx=2)
+        self.macro_realtime_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(macro_buttons, text="Keep recorded timing", variable=self.macro_realtime_var).pack(side=tk.LEFT, padx=2)
         apps_frame = ttk.LabelFrame(remote_frame, text="Apps")
         apps_frame.pack(fill=tk.BOTH, expand=True, pady=10)
         self.app_var = tk.StringVar()
         self.app_dropdown = ttk.Combobox(apps_frame, textvariable=self.app_var, state="readonly")
         self.app_dropdown.pack(fill=tk.X, padx=5, pady=5)
-        ttk.Button(apps_frame, text="Launch App", command=self.launch_selected_app).pack(pady=5)
-        quick_frame = ttk.Frame(apps_frame)
-        quick_frame.pack(fill=tk.X, pady=5)
-        ttk.Button(quick_frame, text="Netflix", command=lambda: self.launch_app("12")).pack(side=tk.LEFT, padx=2)
-        ttk.Button(quick_frame, text="YouTube", command=lambda: self.launch_app("837")).pack(side=tk.LEFT, padx=2)
-        ttk.Button(quick_frame, text="Hulu", command=lambda: self.launch_app("2285")).pack(side=tk.LEFT, padx=2)
+        app_buttons = ttk.Frame(apps_frame)
+        app_buttons.pack(pady=5)
+        ttk.Button(app_buttons, text="Launch App", command=self.launch_selected_app).pack(side=tk.LEFT, padx=2)
+        ttk.Button(app_buttons, text="All Apps...", command=self.open_app_launcher).pack(side=tk.LEFT, padx=2)
+        self.quick_frame = ttk.Frame(apps_frame)
+        self.quick_frame.pack(fill=tk.X, pady=5)
+        self.quick_launch_apps = []
+        self.app_launches = None
+    def hold_button(self, parent, text, key, **kwargs):
+        button = ttk.Button(parent, text=text, **kwargs)
+        button.bind("<ButtonPress-1>", lambda event: self.press_key(key))
+        button.bind("<ButtonRelease-1>", lambda event: self.release_key(key))
+        return button
+    def on_key_press(self, event):
+        key = self.KEYBOARD_KEYS.get(event.keysym)
+        if key is None or getattr(event.widget, "winfo_class", lambda: "")() in self.TEXT_WIDGETS:
+            return None
+        pending = self.key_releases.pop(event.keysym, None)
+        if pending:
+            self.root.after_cancel(pending)
+        if event.keysym not in self.keys_down:
+            self.keys_down.add(event.keysym)
+            self.press_key(key)
+        return "break"
+    def on_key_release(self, event):
+        if event.keysym in self.keys_down:
+            self.key_releases[event.keysym] = self.root.after(50, self.finish_key_release, event.keysym)
+    def check_key_focus(self):
+        try:
+            focused = self.root.focus_get() is not None
+        except KeyError:
+            focused = True
+        if not focused:
+            for keysym in list(self.keys_down):
+                pending = self.key_releases.pop(keysym, None)
+                if pending:
+                    self.root.after_cancel(pending)
+                self.finish_key_release(keysym)
+    def finish_key_release(self, keysym):
+        self.key_releases.pop(keysym, None)
+        self.keys_down.discard(keysym)
+        self.release_key(self.KEYBOARD_KEYS[keysym])
+    def press_key(self, key):
+        if key not in KeyDispatcher.REPEAT_KEYS or self.broadcast_var.get() or not self.roku or not self.dispatcher:
+            self.send_key(key)
+            return
+        if self.held_key is not None or self.device_offline():
+            return
+        self.held_key = key
+        ref = self.history.add_item("Send Key", "Started", f"Holding {key}")
+        if not self.dispatcher.hold(key, ref):
+            self.held_key = None
+            self.status_var.set(f"Key queue full, dropped {key}")
+            self.history.add_item("Send Key", "Failed", f"{key}: Key queue full", ref)
+        self.refresh_history()
+    def release_key(self, key):
+        if self.held_key != key:
+            return
+        self.held_key = None
+        if self.dispatcher:
+            self.dispatcher.release()
+    def on_key_held(self, key, ok, stats, ref=None):
+        count = stats["count"]
+        self.ui.call(self.record_held_key, key, count)
+        details = f"Sent {key} x{count} over {stats['duration']:.1f}s ({stats['interval'] * 1000:.0f} ms apart, {stats['overshoot']} after release)"
+        if ok:
+            self.ui.set(self.status_var, f"Held {key}: {count} press{'es' if count != 1 else ''}, {stats['rtt'] * 1000:.0f} ms round trip")
+            self.ui.call(self.history.add_item, "Send Key", "Success", details, ref, stats["rtt"])
+        else:
+            self.ui.set(self.status_var, f"Failed to send {key} command")
+            self.ui.call(self.history.add_item, "Send Key", "Failed", details, ref, stats["rtt"])
+        self.refresh_history()
+    def record_held_key(self, key, count):
+        for _ in range(count):
+            self.macro_recorder.record("key", key)
     def clear_history(self):
         self.history.clear_history()
-        self.refresh_history()
+        self.app_launches = Counter()
+        self.history_page = 0
+        self.history_filter = None
+        self.history_filter_var.set("")
+        self.rebuild_history_view()
+    def apply_history_filter(self):
+        text = self.history_filter_var.get().strip()
+        if not text:
+            self.reset_history_filter()
+            return
+        try:
+            filters = parse_history_filter(text)
+        except ValueError as e:
+            self.status_var.set(f"Invalid history filter: {e}")
+            return
+        self.history_filter = filters
+        self.history_page_var.set("Searching...")
+        def query_job():
+            try:
+                items = self.history.query(self.HISTORY_PAGE_SIZE, **filters)
+            except Exception as e:
+                self.ui.set(self.status_var, f"History search failed: {e}")
+                return
+            self.ui.update("history_filter", self.show_filtered_history, filters, items)
+        self.bridge.run(query_job)
+    def show_filtered_history(self, filters, items):
+        if self.history_filter is not filters:
+            return
+        self.history_tree.delete(*self.history_tree.get_children())
+        for index, item in enumerate(items):
+            self.history_tree.insert('', 'end', iid=f"q{index}", values=(
+                item.get('timestamp', ''),
+                item.get('action', ''),
+                item.get('status', ''),
+                format_latency(item),
+                item.get('details', '')
+            ))
+        self.history_page_var.set(f"{len(items)} match{'es' if len(items) != 1 else ''}" + (" (newest shown)" if len(items) >= self.HISTORY_PAGE_SIZE else ""))
+    def reset_history_filter(self):
+        self.history_filter_var.set("")
+        if self.history_filter is not None:
+            self.history_filter = None
+            self.history_page = 0
+            self.rebuild_history_view()
+    def open_history_summary(self):
+        if self.history_summary and self.history_summary.winfo_exists():
+            self.history_summary.lift()
+            self.refresh_history_summary()
+            return
+        self.history_summary = tk.Toplevel(self.root)
+        self.history_summary.title("History Summary")
+        self.history_summary.geometry("640x320")
+        columns = ('action', 'count', 'failures', 'rate', 'p50', 'p90', 'p99')
+        self.summary_tree = ttk.Treeview(self.history_summary, columns=columns, show='headings')
+        for column, title, width in zip(columns, ("Action", "Commands", "Failures", "Failure Rate", "p50", "p90", "p99"), (180, 70, 70, 80, 70, 70, 70)):
+            self.summary_tree.heading(column, text=title)
+            self.summary_tree.column(column, width=width, anchor=tk.W if column == 'action' else tk.E)
+        self.summary_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        buttons = ttk.Frame(self.history_summary)
+        buttons.pack(fill=tk.X, padx=5, pady=(0, 5))
+        ttk.Button(buttons, text="Refresh", command=self.refresh_history_summary).pack(side=tk.LEFT, padx=2)
+        self.summary_status_var = tk.StringVar()
+        ttk.Label(buttons, textvariable=self.summary_status_var).pack(side=tk.LEFT, padx=5)
+        self.refresh_history_summary()
+    def refresh_history_summary(self):
+        filters = dict(self.history_filter or {})
+        self.summary_status_var.set("Calculating...")
+        def summary_job():
+            start = time.perf_counter()
+            try:
+                summary = self.history.summary(**filters)
+            except Exception as e:
+                self.ui.set(self.summary_status_var, f"Summary failed: {e}")
+                return
+            self.ui.update("history_summary", self.show_history_summary, summary, filters, time.perf_counter() - start)
+        self.bridge.run(summary_job)
+    def show_history_summary(self, summary, filters, elapsed):
+        if not self.history_summary or not self.history_summary.winfo_exists():
+            return
+        self.summary_tree.delete(*self.summary_tree.get_children())
+        for action, stats in summary.items():
+            self.summary_tree.insert('', 'end', values=(
+                action,
+                stats['count'],
+                stats['failures'],
+                f"{stats['failure_rate'] * 100:.1f}%",
+                *(f"{stats[key]:.0f} ms" if stats[key] is not None else "" for key in ('p50', 'p90', 'p99'))
+            ))
+        total = sum(stats['count'] for stats in summary.values())
+        self.summary_status_var.set(f"{total} command(s){' matching the filter' if filters else ''}, computed in {elapsed * 1000:.0f} ms")
     def refresh_history(self):
+        self.ui.update("history", self.render_history)
+    def render_history(self):
+        if self.history_filter is not None:
+            return
+        start = time.perf_counter()
+        end = self.history.items.next_id
+        if self.history_page == 0:
+            self.render_history_range(max(self.history_rendered, end - self.HISTORY_PAGE_SIZE), end)
+            rows = self.history_tree.get_children()
+            if len(rows) > self.HISTORY_PAGE_SIZE:
+                self.history_tree.delete(*rows[:len(rows) - self.HISTORY_PAGE_SIZE])
+        else:
+            self.update_started_rows(self.history_rendered, end)
+        self.history_rendered = end
+        self.update_history_page_label()
+        METRICS.observe("roku_tk_refresh_seconds", time.perf_counter() - start, view="history")
+    def history_page_bounds(self):
+        items = self.history.items
+        end = max(items.first_id, items.next_id - self.history_page * self.HISTORY_PAGE_SIZE)
+        return max(items.first_id, end - self.HISTORY_PAGE_SIZE), end
+    def rebuild_history_view(self):
         self.history_tree.delete(*self.history_tree.get_children())
-        for i, item in enumerate(self.history.items):
-            self.history_tree.insert('', 'end', iid=str(i), values=(
-                item['timestamp'],
-                item['action'],
-                item['status'],
-                item['details']
+        start, end = self.history_page_bounds()
+        self.render_history_range(start, end)
+        self.history_rendered = self.history.items.next_id
+        self.update_started_rows(end, self.history_rendered)
+        self.update_history_page_label()
+    def render_history_range(self, start, end):
+        for record in self.history.items.range(start, end):
+            if record.ref is not None and (record.ref >= start or self.history_tree.exists(str(record.ref))):
+                if self.history_tree.exists(str(record.ref)):
+                    self.update_history_row(record.ref, record)
+                continue
+            self.history_tree.insert('', 'end', iid=str(record.id), values=(
+                record.timestamp,
+                record.action,
+                record.status,
+                format_latency(record),
+                record.details
             ))
+    def update_started_rows(self, start, end):
+        for record in self.history.items.range(start, end):
+            if record.ref is not None and self.history_tree.exists(str(record.ref)):
+                self.update_history_row(record.ref, record)
+    def update_history_row(self, record_id, record):
+        self.history_tree.set(str(record_id), 'status', record.status)
+        self.history_tree.set(str(record_id), 'latency', format_latency(record))
+        self.history_tree.set(str(record_id), 'details', record.details)
+    def update_history_page_label(self):
+        first_id = self.history.items.first_id
+        start, end = self.history_page_bounds()
+        self.history_page_var.set(f"{start - first_id + 1 if end > start else 0}-{end - first_id} of {len(self.history.items)}")
+    def older_history_page(self):
+        if self.history_filter is None and (self.history_page + 1) * self.HISTORY_PAGE_SIZE < len(self.history.items):
+            self.history_page += 1
+            self.rebuild_history_view()
+    def newer_history_page(self):
+        if self.history_filter is None and self.history_page > 0:
+            self.history_page -= 1
+            self.rebuild_history_view()
     def auto_discover(self):
         self.status_var.set("Searching for Roku devices...")
-        self.history.add_item("Auto-Discover", "Started", "Searching for Roku devices")
+        ref = self.history.add_item("Auto-Discover", "Started", "Searching for Roku devices")
         self.refresh_history()
-        def discover_thread():
+        self.devices = {}
+        self.device_dropdown['values'] = []
+        def on_device(device):
+            self.ui.call(self.add_discovered_device, device)
+        def discover_job():
             try:
-                temp_roku = RokuController(None)
-                if temp_roku.ip_address:
-                    self.ip_var.set(temp_roku.ip_address)
-                    self.root.after(0, lambda: self.status_var.set(f"Found Roku at {temp_roku.ip_address}"))
-                    self.root.after(0, lambda: self.history.add_item("Auto-Discover", "Success", f"Found Roku at {temp_roku.ip_address}"))
-                    self.connect_roku()
+                devices = discover_devices(callback=on_device)
+                if not devices:
+                    self.ui.set(self.status_var, "No SSDP response, scanning the local network...")
+                    devices = scan_devices(callback=on_device, progress=lambda done, total: self.ui.set(self.status_var, f"Scanning network: {done}/{total} addresses, {len(self.devices)} found"))
+                if devices:
+                    self.ui.set(self.status_var, f"Found {len(devices)} Roku device(s)")
+                    self.ui.call(self.history.add_item, "Auto-Discover", "Success", f"Found {len(devices)} Roku device(s)", ref)
                 else:
-                    self.root.after(0, lambda: self.status_var.set("No Roku devices found"))
-                    self.root.after(0, lambda: self.history.add_item("Auto-Discover", "Failed", "No Roku devices found"))
-                    self.root.after(0, lambda: messagebox.showinfo("Auto-Discover", "No Roku devices found. Please enter the IP address manually."))
+                    self.ui.set(self.status_var, "No Roku devices found")
+                    self.ui.call(self.history.add_item, "Auto-Discover", "Failed", "No Roku devices found", ref)
+                    self.ui.call(self.root.after_idle, messagebox.showinfo, "Auto-Discover", "No Roku devices found. Please enter the IP address manually.")
             except Exception as e:
-                self.root.after(0, lambda: self.status_var.set(f"Error: {str(e)}"))
-                self.root.after(0, lambda: self.history.add_item("Auto-Discover", "Error", str(e)))
+                self.ui.set(self.status_var, f"Error: {str(e)}")
+                self.ui.call(self.history.add_item, "Auto-Discover", "Error", str(e), ref)
             finally:
-                self.root.after(0, self.refresh_history)
-        threading.Thread(target=discover_thread, daemon=True).start()
+                self.refresh_history()
+        self.bridge.run(discover_job)
+    def add_discovered_device(self, device):
+        first = not self.devices
+        self.devices[device.key] = device
+        self.device_dropdown['values'] = [self.device_label(d) for d in self.devices.values()]
+        self.status_var.set(f"Found Roku at {device.ip_address}")
+        if first and not self.roku:
+            self.device_dropdown.current(0)
+            self.ip_var.set(device.ip_address)
+            self.connect_roku()
+    def device_label(self, device):
+        return f"{join_host_port(device.ip_address, device.port)} ({device.serial_number or 'unknown serial'})"
+    def select_device(self, event=None):
+        label = self.device_var.get()
+        for device in self.devices.values():
+            if self.device_label(device) == label:
+                self.ip_var.set(join_host_port(device.ip_address, device.port))
+                break
     def connect_roku(self):
         ip = self.ip_var.get().strip()
         if not ip:
@@ -422,33 +3648,158 @@ class RokuGUI:
             self.history.add_item("Connect", "Failed", "No IP address provided")
             self.refresh_history()
             return
+        try:
+            host, port = split_host_port(ip)
+        except ValueError:
+            messagebox.showerror("Error", f"Invalid address: {ip}")
+            return
         self.status_var.set(f"Connecting to {ip}...")
-        self.history.add_item("Connect", "Started", f"Connecting to {ip}")
+        self.history.device = ip
+        ref = self.history.add_item("Connect", "Started", f"Connecting to {ip}")
         self.refresh_history()
-        def connect_thread():
+        def connect_job():
             try:
-                self.roku = RokuController(ip)
-                if not self.roku.get_app_list():
-                    self.root.after(0, lambda: self.status_var.set("Failed to connect to Roku device"))
-                    self.root.after(0, lambda: self.history.add_item("Connect", "Failed", f"Could not get app list from {ip}"))
+                self.roku = RokuController(host, registry=self.registry, on_revalidate=self.on_revalidate, port=port)
+                if not self.roku.connected:
+                    self.ui.set(self.status_var, "Failed to connect to Roku device")
+                    self.ui.call(self.history.add_item, "Connect", "Failed", f"Could not get app list from {ip}", ref)
                     return
-                self.root.after(0, self.update_app_dropdown)
-                self.root.after(0, self.refresh_tv_info)
-                self.root.after(0, lambda: self.status_var.set(f"Connected to Roku at {self.roku.ip_address}"))
-                self.root.after(0, lambda: self.history.add_item("Connect", "Success", f"Connected to Roku at {self.roku.ip_address}"))
+                if self.dispatcher:
+                    self.dispatcher.stop()
+                self.dispatcher = KeyDispatcher(self.roku, self.on_key_sent, coalesce=self.coalesce_var.get(), hold_callback=self.on_key_held)
+                if self.aroku:
+                    self.bridge.submit(self.aroku.close())
+                self.aroku = AsyncRokuController(self.roku.ip_address, port=self.roku.port)
+                self.watch_health(self.roku)
+                self.start_state_monitor(self.roku)
+                self.ui.update("apps", self.update_app_dropdown)
+                self.ui.update("tv_info", self.show_tv_info, self.roku.device_info)
+                self.ui.set(self.status_var, f"Connected to Roku at {self.roku.ip_address}")
+                self.ui.call(self.history.add_item, "Connect", "Success", f"Connected to Roku at {self.roku.ip_address}", ref)
             except Exception as e:
-                self.root.after(0, lambda: self.status_var.set(f"Connection error: {str(e)}"))
-                self.root.after(0, lambda: self.history.add_item("Connect", "Error", str(e)))
+                self.ui.set(self.status_var, f"Connection error: {str(e)}")
+                self.ui.call(self.history.add_item, "Connect", "Error", str(e), ref)
             finally:
-                self.root.after(0, self.refresh_history)
-        threading.Thread(target=connect_thread, daemon=True).start()
+                self.refresh_history()
+        self.bridge.run(connect_job)
+    def watch_health(self, roku):
+        if self.health_listener:
+            health, listener = self.health_listener
+            if listener in health.listeners:
+                health.listeners.remove(listener)
+        def listener(state):
+            self.ui.call(self.on_health_change, roku, state)
+        roku.health.listeners.append(listener)
+        self.health_listener = (roku.health, listener)
+        self.ui.update("health", self.show_health, roku)
+    def on_health_change(self, roku, state):
+        if roku is not self.roku:
+            return
+        self.show_health(roku)
+        if state == "open":
+            self.status_var.set(f"Roku at {roku.ip_address} is not responding - commands paused")
+            self.history.add_item("Device Health", "Offline", f"{roku.ip_address} stopped responding; probing in the background")
+        elif state == "closed":
+            self.status_var.set(f"Roku at {roku.ip_address} is responding again")
+            self.history.add_item("Device Health", "Online", f"{roku.ip_address} is responding again")
+        self.refresh_history()
+    def show_health(self, roku):
+        summary = roku.health.summary()
+        if summary["state"] == "closed":
+            text = f"Health: OK, {summary['success_rate']:.0%} success, {summary['latency_p50_ms']:.0f} ms median"
+        elif summary["state"] == "open":
+            text = f"Health: offline, {summary['rejected']} command(s) skipped, next probe in {summary['retry_in']:.0f}s"
+        else:
+            text = "Health: probing..."
+        if roku.wake_mac():
+            text += " (Wake-on-LAN available)"
+        self.health_var.set(text)
+    def device_offline(self):
+        if self.roku and self.roku.health.state != "closed" and not self.broadcast_var.get():
+            self.status_var.set(f"Roku at {self.roku.ip_address} is not responding - command skipped")
+            self.roku.health.reject()
+            self.show_health(self.roku)
+            return True
+        return False
+    def wake_roku(self):
+        if not self.roku:
+            self.status_var.set("Not connected to any Roku device")
+            return
+        roku = self.roku
+        if not roku.wake_mac():
+            self.status_var.set("This Roku does not report Wake-on-LAN support")
+            return
+        ref = self.history.add_item("Wake", "Started", f"Sending Wake-on-LAN to {roku.ip_address}")
+        self.refresh_history()
+        def wake_job():
+            ok = roku.wake()
+            self.ui.call(self.history.add_item, "Wake", "Success" if ok else "Failed", f"{roku.ip_address} {'woke up' if ok else 'did not wake up'}", ref)
+            self.ui.set(self.status_var, "Roku is awake" if ok else "Roku did not answer after Wake-on-LAN")
+            self.refresh_history()
+        self.bridge.run(wake_job)
+    def load_known_devices(self):
+        for device in self.registry.known_devices():
+            self.devices[device.key] = device
+        self.device_dropdown['values'] = [self.device_label(d) for d in self.devices.values()]
+        if self.devices:
+            self.device_dropdown.current(0)
+            if not self.ip_var.get():
+                self.select_device()
+    def on_revalidate(self, roku, ok):
+        if roku is not self.roku:
+            return
+        if ok:
+            self.ui.update("apps", self.update_app_dropdown)
+            self.ui.update("tv_info", self.show_tv_info, roku.device_info)
+            self.ui.set(self.ip_var, join_host_port(roku.ip_address, roku.port))
+            if self.aroku and self.aroku.ip_address != roku.ip_address:
+                self.bridge.submit(self.aroku.close())
+                self.aroku = AsyncRokuController(roku.ip_address, port=roku.port)
+        else:
+            self.ui.set(self.status_var, f"Cached Roku at {roku.ip_address} is not responding")
+    def on_device_notify(self, device):
+        if not self.registry.update_location(device):
+            return
+        self.ui.call(self.add_discovered_device, device)
+        if self.roku and self.roku.device_info.serial_number == device.serial_number:
+            self.ui.set(self.status_var, f"Roku moved to {device.ip_address}, reconnecting...")
+            self.ui.set(self.ip_var, device.ip_address)
+            self.ui.call(self.connect_roku)
     def update_app_dropdown(self):
         if not self.roku:
             return
-        app_options = [f"{app_name} ({app_id})" for app_id, app_name in self.roku.app_list]
+        app_options = [f"{app.name} ({app.id})" for app in self.roku.app_list]
         self.app_dropdown['values'] = app_options
         if app_options:
             self.app_dropdown.current(0)
+        self.update_quick_launch()
+    def update_quick_launch(self):
+        if not self.roku:
+            return
+        if self.app_launches is None:
+            self.bridge.run(lambda: app_usage(self.history.query(None, action="Launch App", status="Success")), callback=self.set_app_launches)
+            return
+        apps = quick_launch_apps(self.roku.app_list, self.app_launches)
+        if apps == self.quick_launch_apps:
+            return
+        self.quick_launch_apps = apps
+        for child in self.quick_frame.winfo_children():
+            child.destroy()
+        for app in apps:
+            ttk.Button(self.quick_frame, text=app.name, command=lambda app=app: self.launch_app(app.id, app.name)).pack(side=tk.LEFT, padx=2)
+    def set_app_launches(self, usage):
+        self.app_launches = usage
+        self.update_quick_launch()
+    def open_app_launcher(self):
+        if not self.roku or not self.roku.app_list:
+            self.status_var.set("Connect to a Roku device to browse its apps")
+            return
+        if self.launcher and self.launcher.window.winfo_exists() and self.launcher.roku is self.roku:
+            self.launcher.window.lift()
+            return
+        if self.launcher and self.launcher.window.winfo_exists():
+            self.launcher.window.destroy()
+        self.launcher = AppLauncher(self.ui, self.roku, self.icon_cache, self.launch_app)
     def launch_selected_app(self):
         if not self.roku:
             self.status_var.set("Not connected to any Roku device")
@@ -462,63 +3813,243 @@ class RokuGUI:
         app_name = selected.split(' (')[0]
         self.launch_app(app_id, app_name)
     def launch_app(self, app_id, app_name=None):
-        if not self.roku:
+        self.macro_recorder.record("launch", app_id)
+        if self.state_monitor:
+            self.state_monitor.poke()
+        if self.broadcast_var.get():
+            self.broadcast("Launch App", lambda fleet: fleet.launch_app(app_id))
+            return
+        if not self.roku or not self.aroku:
             self.status_var.set("Not connected to any Roku device")
             self.history.add_item("Launch App", "Failed", "Not connected to any Roku device")
             self.refresh_history()
             return
+        if self.device_offline():
+            return
         if app_name is None:
-            for id, name in self.roku.app_list:
-                if id == app_id:
-                    app_name = name
+            for app in self.roku.app_list:
+                if app.id == app_id:
+                    app_name = app.name
                     break
             if app_name is None:
                 app_name = f"App ID {app_id}"
         self.status_var.set(f"Launching {app_name}...")
-        self.history.add_item("Launch App", "Started", f"Launching {app_name} (ID: {app_id})")
+        ref = self.history.add_item("Launch App", "Started", f"Launching {app_name} (ID: {app_id})")
+        self.refresh_history()
+        def on_launch(result):
+            if result:
+                self.status_var.set(f"Launched {app_name}")
+                self.history.add_item("Launch App", "Success", f"Launched {app_name} (ID: {app_id})", ref)
+                if self.app_launches is not None:
+                    self.app_launches[app_id] += 1
+                self.update_quick_launch()
+            else:
+                self.status_var.set(f"Failed to launch {app_name}")
+                self.history.add_item("Launch App", "Failed", f"Failed to launch {app_name} (ID: {app_id})", ref)
+            self.refresh_history()
+        def on_error(e):
+            self.status_var.set(f"Error: {str(e)}")
+            self.history.add_item("Launch App", "Error", str(e), ref)
+            self.refresh_history()
+        self.bridge.submit(self.aroku.launch_app(app_id), on_launch, on_error)
+    def send_key(self, key):
+        self.macro_recorder.record("key", key)
+        if self.broadcast_var.get():
+            self.broadcast("Send Key", lambda fleet: fleet.send_keypress(key))
+            return
+        if not self.roku or not self.dispatcher:
+            self.status_var.set("Not connected to any Roku device")
+            self.history.add_item("Send Key", "Failed", f"{key}: Not connected to any Roku device")
+            self.refresh_history()
+            return
+        if self.device_offline():
+            return
+        ref = self.history.add_item("Send Key", "Started", f"Sending {key} command")
+        if not self.dispatcher.submit(key, ref):
+            self.status_var.set(f"Key queue full, dropped {key}")
+            self.history.add_item("Send Key", "Failed", f"{key}: Key queue full", ref)
+        self.refresh_history()
+    def on_key_sent(self, key, ok, latency, ref=None):
+        depth = self.dispatcher.queue_depth() if self.dispatcher else 0
+        if ok and self.state_monitor and key not in KeyDispatcher.NAVIGATION_KEYS:
+            self.state_monitor.poke()
+        if ok:
+            self.ui.set(self.status_var, f"Sent {key} command ({latency * 1000:.0f} ms, {depth} queued)")
+            self.ui.call(self.history.add_item, "Send Key", "Success", f"Sent {key} command", ref, latency)
+        else:
+            self.ui.set(self.status_var, f"Failed to send {key} command")
+            self.ui.call(self.history.add_item, "Send Key", "Failed", f"Failed to send {key} command", ref, latency)
+        self.refresh_history()
+    def save_fleet_group(self):
+        name = simpledialog.askstring("Fleet Group", "Group name:", parent=self.root)
+        if not name:
+            return
+        ip_addresses = [device.ip_address for device in self.devices.values()]
+        if not ip_addresses and self.roku:
+            ip_addresses = [self.roku.ip_address]
+        self.fleet_groups.set_group(name, ip_addresses)
+        self.fleets.pop(name, None)
+        self.fleet_dropdown['values'] = self.fleet_groups.names()
+        self.fleet_group_var.set(name)
+        self.status_var.set(f"Saved fleet group {name} with {len(ip_addresses)} device(s)")
+    def broadcast(self, action, operation):
+        name = self.fleet_group_var.get()
+        ip_addresses = self.fleet_groups.get(name)
+        if not ip_addresses:
+            self.status_var.set("Select a fleet group with at least one device")
+            self.history.add_item(f"Fleet {action}", "Failed", "No fleet group selected")
+            self.refresh_history()
+            return
+        fleet = self.fleets.get(name)
+        if fleet is None or sorted(fleet.controllers) != ip_addresses:
+            fleet = self.fleets[name] = FleetController(ip_addresses)
+        self.status_var.set(f"Broadcasting to {len(ip_addresses)} device(s) in {name}...")
+        ref = self.history.add_item(f"Fleet {action}", "Started", f"Group {name}")
         self.refresh_history()
-        def launch_thread():
+        def fleet_job():
             try:
-                result = self.roku.launch_app(app_id)
-                if result:
-                    self.root.after(0, lambda: self.status_var.set(f"Launched {app_name}"))
-                    self.root.after(0, lambda: self.history.add_item("Launch App", "Success", f"Launched {app_name} (ID: {app_id})"))
-                else:
-                    self.root.after(0, lambda: self.status_var.set(f"Failed to launch {app_name}"))
-                    self.root.after(0, lambda: self.history.add_item("Launch App", "Failed", f"Failed to launch {app_name} (ID: {app_id})"))
+                result = operation(fleet)
+                status = "Success" if not result.failed else "Failed"
+                details = result.summary()
+                if result.failed:
+                    details += f"; failed: {', '.join(result.failed)}"
+                self.ui.set(self.status_var, result.summary())
+                self.ui.call(self.history.add_item, f"Fleet {action}", status, details, ref)
             except Exception as e:
-                self.root.after(0, lambda: self.status_var.set(f"Error: {str(e)}"))
-                self.root.after(0, lambda: self.history.add_item("Launch App", "Error", str(e)))
+                self.ui.set(self.status_var, f"Fleet error: {str(e)}")
+                self.ui.call(self.history.add_item, f"Fleet {action}", "Error", str(e), ref)
             finally:
-                self.root.after(0, self.refresh_history)
-        threading.Thread(target=launch_thread, daemon=True).start()
-    def send_key(self, key):
+                self.refresh_history()
+        self.bridge.run(fleet_job)
+    def send_text(self):
+        text = self.text_entry_var.get()
+        if not text:
+            return
         if not self.roku:
             self.status_var.set("Not connected to any Roku device")
-            self.history.add_item("Send Key", "Failed", f"{key}: Not connected to any Roku device")
+            self.history.add_item("Send Text", "Failed", "Not connected to any Roku device")
             self.refresh_history()
             return
-        self.history.add_item("Send Key", "Started", f"Sending {key} command")
-        self.refresh_history()
+        if self.device_offline():
+            return
+        self.macro_recorder.record("text", text)
+        if self.text_cancel:
+            self.text_cancel.set()
+        cancel = self.text_cancel = threading.Event()
+        roku = self.roku
+        self.text_progress.configure(maximum=len(text), value=0)
+        self.status_var.set(f"Typing {len(text)} characters...")
+        ref = self.history.add_item("Send Text", "Started", f"Typing '{text}'")
         self.refresh_history()
-        def key_thread():
+        def on_progress(done, total):
+            self.ui.update("text_progress", self.text_progress.configure, value=done)
+        def text_job():
+            start = time.perf_counter()
             try:
-                if self.roku.send_keypress(key):
-                    self.root.after(0, lambda: self.status_var.set(f"Sent {key} command"))
-                    self.root.after(0, lambda: self.history.add_item("Send Key", "Success", f"Sent {key} command"))
+                delivered = roku.send_text(text, cancel_event=cancel, progress=on_progress)
+                elapsed = time.perf_counter() - start
+                if cancel.is_set():
+                    status, details = "Cancelled", f"Typed {delivered} of {len(text)} characters"
+                elif delivered == len(text):
+                    status, details = "Success", f"Typed '{text}' in {elapsed * 1000:.0f} ms"
                 else:
-                    self.root.after(0, lambda: self.status_var.set(f"Failed to send {key} command"))
-                    self.root.after(0, lambda: self.history.add_item("Send Key", "Failed", f"Failed to send {key} command"))
+                    status, details = "Failed", f"Typed {delivered} of {len(text)} characters"
+                self.ui.set(self.status_var, details)
+                self.ui.call(self.history.add_item, "Send Text", status, details, ref)
             except Exception as e:
-                self.root.after(0, lambda: self.status_var.set(f"Error: {str(e)}"))
-                self.root.after(0, lambda: self.history.add_item("Send Key", "Error", str(e)))
+                self.ui.set(self.status_var, f"Error: {str(e)}")
+                self.ui.call(self.history.add_item, "Send Text", "Error", str(e), ref)
             finally:
-                self.root.after(0, self.refresh_history)
-        threading.Thread(target=key_thread, daemon=True).start()
+                self.refresh_history()
+        self.bridge.run(text_job)
+    def cancel_text(self):
+        if self.text_cancel:
+            self.text_cancel.set()
+    def toggle_macro_recording(self):
+        if not self.macro_recorder.recording:
+            self.macro_recorder.start()
+            self.record_button_var.set("Save Recording")
+            self.status_var.set("Recording macro - use the remote, then save")
+            return
+        name = self.macro_var.get().strip() or simpledialog.askstring("Macro", "Macro name:", parent=self.root)
+        self.record_button_var.set("Record")
+        if not name:
+            self.macro_recorder.recording = False
+            self.status_var.set("Macro recording discarded")
+            return
+        macro = self.macro_recorder.stop(name)
+        self.macro_store.save_macro(macro)
+        self.macro_dropdown['values'] = self.macro_store.names()
+        self.macro_var.set(name)
+        self.status_var.set(f"Saved macro {name} with {len(macro.steps)} step(s)")
+        self.history.add_item("Macro", "Recorded", f"{name}: {len(macro.steps)} step(s)")
+        self.refresh_history()
+    def play_macro(self):
+        macro = self.macro_store.get(self.macro_var.get().strip())
+        if macro is None:
+            self.status_var.set("Select a saved macro first")
+            return
+        if self.broadcast_var.get():
+            self.broadcast("Play Macro", lambda fleet: fleet.run(f"macro {macro.name}", lambda roku: MacroPlayer(roku).play(macro, self.macro_realtime_var.get()), result_of=lambda value: value and value["ok"], timeout=600))
+            return
+        if not self.roku:
+            self.status_var.set("Not connected to any Roku device")
+            return
+        if self.macro_cancel:
+            self.macro_cancel.set()
+        cancel = self.macro_cancel = threading.Event()
+        player = MacroPlayer(self.roku)
+        realtime = self.macro_realtime_var.get()
+        self.status_var.set(f"Playing macro {macro.name}...")
+        ref = self.history.add_item("Play Macro", "Started", f"{macro.name}: {len(macro.steps)} step(s)")
+        self.refresh_history()
+        def macro_job():
+            try:
+                result = player.play(macro, realtime, cancel)
+                status = "Success" if result["ok"] else ("Cancelled" if cancel.is_set() else "Failed")
+                self.ui.set(self.status_var, macro_report(macro, result))
+                self.ui.call(self.history.add_item, "Play Macro", status, macro_report(macro, result), ref)
+            except Exception as e:
+                self.ui.set(self.status_var, f"Macro error: {str(e)}")
+                self.ui.call(self.history.add_item, "Play Macro", "Error", str(e), ref)
+            finally:
+                self.refresh_history()
+        self.bridge.run(macro_job)
+    def stop_macro(self):
+        if self.macro_cancel:
+            self.macro_cancel.set()
+    def schedule_macro(self):
+        macro = self.macro_store.get(self.macro_var.get().strip())
+        if macro is None:
+            self.status_var.set("Select a saved macro first")
+            return
+        at = simpledialog.askstring("Schedule Macro", "Run daily at (HH:MM):", parent=self.root)
+        if not at or not re.fullmatch(r"\d{1,2}:\d{2}", at.strip()):
+            return
+        if self.broadcast_var.get() and self.fleet_group_var.get():
+            entry = self.macro_store.add_schedule(macro.name, at.strip(), group=self.fleet_group_var.get(), realtime=self.macro_realtime_var.get())
+            target = f"group {self.fleet_group_var.get()}"
+        elif self.roku:
+            entry = self.macro_store.add_schedule(macro.name, at.strip(), [self.roku.ip_address], realtime=self.macro_realtime_var.get())
+            target = self.roku.ip_address
+        else:
+            self.status_var.set("Connect to a device or select a fleet group to schedule")
+            return
+        self.macro_scheduler.add(entry)
+        self.status_var.set(f"Scheduled {macro.name} daily at {at.strip()} on {target}")
+        self.history.add_item("Macro", "Scheduled", f"{macro.name} daily at {at.strip()} on {target}")
+        self.refresh_history()
+    def on_scheduled_macro(self, entry, result):
+        status = "Success" if not result.failed else "Failed"
+        self.ui.call(self.history.add_item, "Scheduled Macro", status, result.summary())
+        self.refresh_history()
+    def toggle_coalesce(self):
+        if self.dispatcher:
+            self.dispatcher.coalesce = self.coalesce_var.get()
     def toggle_voice_control(self):
         if not self.voice:
             try:
-                self.voice = VoiceRecognizer(self.process_voice_command)
+                self.voice = VoiceRecognizer(self.process_voice_command, partial_callback=self.process_partial_voice_command)
                 self.start_voice_control()
             except Exception as e:
                 messagebox.showerror("Voice Control Error", f"Could not initialize voice control: {str(e)}")
@@ -536,9 +4067,11 @@ class RokuGUI:
         self.history.add_item("Voice Control", "Started", "Voice recognition started")
         self.refresh_history()
         try:
+            if self.roku:
+                self.voice.set_grammar(self.voice_matcher.vocabulary(self.roku.app_list))
             if self.voice.start_listening():
                 self.voice_button_var.set("Stop Voice Control")
-                self.voice_status_var.set("Voice control active - speak commands")
+                self.voice_status_var.set(f"Voice control active ({self.voice.backend.name}) - speak commands")
                 self.status_var.set("Voice control active")
             else:
                 self.voice_status_var.set("Voice control failed to start")
@@ -557,75 +4090,940 @@ class RokuGUI:
         self.status_var.set("Voice control stopped")
         self.history.add_item("Voice Control", "Stopped", "Voice recognition stopped")
         self.refresh_history()
+    def process_partial_voice_command(self, command):
+        if not self.roku:
+            return False
+        intent = self.voice_matcher.match(command, self.roku.app_list)
+        if intent.kind == "launch" and self.voice_matcher.apps.exact(command):
+            self.ui.call(self.history.add_item, "Voice Command", "Received", f"'{command}' (partial)")
+            self.ui.call(self.launch_app, intent.value, intent.name)
+        elif intent.kind == "key" and intent.value in self.voice_matcher.SINGLE_SHOT_KEYS:
+            self.ui.call(self.history.add_item, "Voice Command", "Received", f"'{command}' (partial)")
+            for _ in range(intent.count):
+                self.ui.call(self.send_key, intent.value)
+        else:
+            return False
+        self.voice_partial = intent
+        return True
+    def show_voice_latency(self):
+        if self.voice and self.voice.last_latency is not None:
+            self.voice_status_var.set(f"Voice control active ({self.voice.backend.name}) - last command {self.voice.last_latency * 1000:.0f} ms after speech")
     def process_voice_command(self, command):
         if not self.roku:
-            self.root.after(0, lambda: self.status_var.set("Voice command received but not connected to Roku"))
-            self.root.after(0, lambda: self.history.add_item("Voice Command", "Failed", f"'{command}': Not connected to Roku"))
-            self.root.after(0, self.refresh_history)
-            return
-        self.root.after(0, lambda: self.history.add_item("Voice Command", "Received", f"'{command}'"))
-        self.root.after(0, self.refresh_history)
-        if "open" in command or "launch" in command or "start" in command:
-            app_name = None
-            for app_id, name in self.roku.app_list:
-                if name.lower() in command:
-                    app_name = name
-                    self.root.after(0, lambda id=app_id, name=name: self.launch_app(id, name))
+            self.ui.set(self.status_var, "Voice command received but not connected to Roku")
+            self.ui.call(self.history.add_item, "Voice Command", "Failed", f"'{command}': Not connected to Roku")
+            self.refresh_history()
+            return
+        partial, self.voice_partial = self.voice_partial, None
+        intent = self.voice_matcher.match(command, self.roku.app_list)
+        if partial:
+            if intent.kind == "key" and intent.value == partial.value:
+                for _ in range(intent.count - partial.count):
+                    self.ui.call(self.send_key, intent.value)
+            self.ui.update("voice_latency", self.show_voice_latency)
+            return
+        self.ui.call(self.history.add_item, "Voice Command", "Received", f"'{command}'")
+        self.refresh_history()
+        self.ui.update("voice_latency", self.show_voice_latency)
+        if intent.kind == "launch":
+            self.ui.call(self.launch_app, intent.value, intent.name)
+        elif intent.kind == "key":
+            for _ in range(intent.count):
+                self.ui.call(self.send_key, intent.value)
+        elif intent.kind == "unknown_app":
+            self.ui.set(self.status_var, f"App not recognized in voice command: '{command}'")
+            self.ui.call(self.history.add_item, "Voice Command", "Failed", f"App not recognized: '{command}'")
+            self.refresh_history()
+        else:
+            self.ui.set(self.status_var, f"Unrecognized voice command: '{command}'")
+            self.ui.call(self.history.add_item, "Voice Command", "Unrecognized", f"'{command}'")
+            self.refresh_history()
+class RokuDaemon:
+    def __init__(self, roku, host="127.0.0.1", port=8061):
+        self.roku = roku
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+    def make_handler(self):
+        daemon = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            def log_message(self, format, *args):
+                pass
+            def reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def do_POST(self):
+                parts = urllib.parse.unquote(self.path).strip("/").split("/", 1)
+                if len(parts) != 2:
+                    self.reply(404, {"error": "not found"})
+                    return
+                action, value = parts
+                if action in ("keypress", "keydown", "keyup"):
+                    ok = daemon.roku.post_key(action, value)
+                elif action == "launch":
+                    ok = daemon.roku.launch_app(value)
+                else:
+                    self.reply(404, {"error": "not found"})
+                    return
+                self.reply(200 if ok else 502, {"ok": ok})
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/query/apps":
+                    ok = daemon.roku.get_app_list()
+                    self.reply(200 if ok else 502, [app.to_dict() for app in daemon.roku.app_list])
+                elif path == "/query/device-info":
+                    ok = daemon.roku.get_device_info()
+                    self.reply(200 if ok else 502, daemon.roku.device_info.to_dict())
+                elif path == "/health":
+                    health = daemon.roku.health.summary()
+                    self.reply(200 if health["state"] == "closed" else 503, {"ok": health["state"] == "closed", "roku": daemon.roku.ip_address, "health": health})
+                elif path == "/metrics":
+                    body = METRICS.to_prometheus().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.reply(404, {"error": "not found"})
+        return Handler
+    def serve_forever(self):
+        host, port = self.server.server_address[:2]
+        print(f"Serving Roku {self.roku.ip_address} on http://{host}:{port}")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+class MockRokuServer:
+    SAMPLE_APPS = [("12", "Netflix"), ("837", "YouTube"), ("2285", "Hulu"), ("13", "Prime Video"), ("291097", "Disney Plus")]
+    def __init__(self, host="127.0.0.1", port=ECP_PORT, delay=0.0, jitter=0.0, failure_rate=0.0, app_count=5, ssdp_port=None, serial_number="MOCK00000001"):
+        self.host = host
+        self.delay = delay
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.ssdp_port = ssdp_port
+        self.serial_number = serial_number
+        self.apps = list(self.SAMPLE_APPS[:app_count])
+        for i in range(len(self.apps), app_count):
+            self.apps.append((str(100000 + i), f"Channel {i}"))
+        self.active_app = None
+        self.keys = []
+        self.started = time.time()
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.ssdp_sock = None
+        self.threads = []
+    @property
+    def device_info(self):
+        return {
+            "udn": f"mock-{self.serial_number}",
+            "serial-number": self.serial_number,
+            "model-name": "Mock Roku",
+            "model-number": "0000X",
+            "software-version": "12.5.0",
+            "network-type": "ethernet",
+            "ethernet-mac": "00:00:00:00:00:01",
+            "screen-size": "55",
+            "supports-wake-on-wlan": "false",
+            "power-mode": "PowerOn",
+            "uptime": str(int(time.time() - self.started))
+        }
+    def apps_xml(self):
+        apps = ''.join(f'<app id="{app_id}" type="appl" version="1.0.{i}">{name}</app>' for i, (app_id, name) in enumerate(self.apps))
+        return f'<?xml version="1.0" encoding="UTF-8" ?>\n<apps>{apps}</apps>'.encode()
+    def device_info_xml(self):
+        fields = ''.join(f"<{tag}>{value}</{tag}>" for tag, value in self.device_info.items())
+        return f'<?xml version="1.0" encoding="UTF-8" ?>\n<device-info>{fields}</device-info>'.encode()
+    def active_app_xml(self):
+        app = '<app>Roku</app>'
+        for app_id, name in self.apps:
+            if app_id == self.active_app:
+                app = f'<app id="{app_id}" type="appl" version="1.0.0">{name}</app>'
+        return f'<?xml version="1.0" encoding="UTF-8" ?>\n<active-app>{app}</active-app>'.encode()
+    def icon_png(self, app_id, width=290, height=218):
+        color = bytes(int(app_id) * factor % 256 for factor in (37, 91, 53)) if app_id.isdigit() else b"\x80\x80\x80"
+        rows = b"".join(b"\x00" + color * width for _ in range(height))
+        def chunk(kind, data):
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+        return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+    def media_player_xml(self):
+        for app_id, name in self.apps:
+            if app_id == self.active_app:
+                position = int((time.time() - self.started) * 1000)
+                return (f'<?xml version="1.0" encoding="UTF-8" ?>\n<player error="false" state="play"><plugin id="{app_id}" name="{name}" bandwidth="10000000 bps"/>'
+                        f'<position>{position} ms</position><duration>3600000 ms</duration><is_live>false</is_live></player>').encode()
+        return b'<?xml version="1.0" encoding="UTF-8" ?>\n<player error="false" state="close"/>'
+    def make_handler(self):
+        mock = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+            def log_message(self, format, *args):
+                pass
+            def reply(self, status, body=b''):
+                self.send_response(status)
+                if body:
+                    self.send_header("Content-Type", "text/xml; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def simulate(self):
+                delay = mock.delay + random.uniform(-mock.jitter, mock.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+                if mock.failure_rate and random.random() < mock.failure_rate:
+                    self.reply(503)
+                    return False
+                return True
+            def do_POST(self):
+                if self.headers.get("Content-Length"):
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                if not self.simulate():
+                    return
+                parts = self.path.strip("/").split("/", 1)
+                if len(parts) == 2 and parts[0] in ("keypress", "keydown", "keyup"):
+                    mock.keys.append((parts[0], urllib.parse.unquote(parts[1])))
+                    if parts[1] == "Home":
+                        mock.active_app = None
+                    self.reply(200)
+                elif len(parts) == 2 and parts[0] == "launch":
+                    if any(app_id == parts[1] for app_id, _ in mock.apps):
+                        mock.active_app = parts[1]
+                        self.reply(200)
+                    else:
+                        self.reply(404)
+                else:
+                    self.reply(404)
+            def do_GET(self):
+                if not self.simulate():
+                    return
+                if self.path == "/query/apps":
+                    self.reply(200, mock.apps_xml())
+                elif self.path == "/query/device-info":
+                    self.reply(200, mock.device_info_xml())
+                elif self.path == "/query/active-app":
+                    self.reply(200, mock.active_app_xml())
+                elif self.path == "/query/media-player":
+                    self.reply(200, mock.media_player_xml())
+                elif self.path.startswith("/query/icon/") and any(self.path == f"/query/icon/{app_id}" for app_id, _ in mock.apps):
+                    self.send_response(200)
+                    body = mock.icon_png(self.path.rsplit("/", 1)[1])
+                    self.send_header("Content-Type", "image/png")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.reply(404)
+        return Handler
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        if self.ssdp_port is not None:
+            self.ssdp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.ssdp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.ssdp_sock.bind((self.host, self.ssdp_port))
+            self.ssdp_port = self.ssdp_sock.getsockname()[1]
+            thread = threading.Thread(target=self.ssdp_loop, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+    def ssdp_loop(self):
+        response = ("HTTP/1.1 200 OK\r\n"
+                    "Cache-Control: max-age=3600\r\n"
+                    "ST: roku:ecp\r\n"
+                    f"Location: http://{self.host}:{self.port}/\r\n"
+                    f"USN: uuid:roku:ecp:{self.serial_number}\r\n"
+                    "Server: Roku/12.5.0 UPnP/1.0 Roku/12.5.0\r\n\r\n").encode()
+        while True:
+            try:
+                data, addr = self.ssdp_sock.recvfrom(65507)
+            except OSError:
+                return
+            if data.startswith(b'M-SEARCH') and b'roku:ecp' in data:
+                self.ssdp_sock.sendto(response, addr)
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.ssdp_sock:
+            self.ssdp_sock.close()
+    def serve_forever(self):
+        self.start()
+        print(f"Mock Roku ECP server on http://{self.host}:{self.port}" + (f", SSDP on udp/{self.ssdp_port}" if self.ssdp_port is not None else ""))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+def latency_report(name, latencies):
+    print(f"{name}: p50 {percentile(latencies, 50) * 1000:.2f} ms, p95 {percentile(latencies, 95) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.2f} ms over {len(latencies)} requests")
+    return {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99)}
+class LatencyProxy:
+    def __init__(self, target_host, target_port, rtt, host="127.0.0.1"):
+        self.target = (target_host, target_port)
+        self.delay = rtt / 2
+        self.host = host
+        self.port = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+    def start(self):
+        self.server = self.loop.run_until_complete(asyncio.start_server(self.handle, self.host, 0))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.thread.start()
+        return self
+    async def forward(self, reader, writer):
+        async def deliver(data, due):
+            await asyncio.sleep(max(0.0, due - self.loop.time()))
+            writer.write(data)
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
                     break
-            if not app_name:
-                if "youtube" in command:
-                    self.root.after(0, lambda: self.launch_app("837", "YouTube"))
-                elif "netflix" in command:
-                    self.root.after(0, lambda: self.launch_app("12", "Netflix"))
-                elif "hulu" in command:
-                    self.root.after(0, lambda: self.launch_app("2285", "Hulu"))
-                elif "prime" in command or "amazon" in command:
-                    self.root.after(0, lambda: self.launch_app("13", "Amazon Prime Video"))
-                elif "disney" in command:
-                    self.root.after(0, lambda: self.launch_app("291097", "Disney+"))
-                elif "hbo" in command:
-                    self.root.after(0, lambda: self.launch_app("61322", "HBO Max"))
+                self.loop.create_task(deliver(data, self.loop.time() + self.delay))
+        except OSError:
+            pass
+        await asyncio.sleep(self.delay)
+        writer.close()
+    async def handle(self, client_reader, client_writer):
+        try:
+            server_reader, server_writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(self.forward(client_reader, server_writer), self.forward(server_reader, client_writer))
+    def stop(self):
+        self.server.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1)
+def benchmark_ecp(ip_address=None, port=ECP_PORT, requests_count=200, delay=0.0, jitter=0.0, failure_rate=0.0, rtt=0.0):
+    mock = proxy = None
+    if ip_address is None:
+        mock = MockRokuServer(port=0, delay=delay, jitter=jitter, failure_rate=failure_rate, ssdp_port=0).start()
+        ip_address, port = mock.host, mock.port
+        if rtt:
+            proxy = LatencyProxy(mock.host, mock.port, rtt).start()
+            port = proxy.port
+            print(f"mock behind a proxy adding {rtt * 1000:.0f} ms round-trip time")
+    results = {}
+    try:
+        roku = RokuController(ip_address, port=port, fetch_info=False)
+        base_url = roku.base_url
+        latencies = []
+        for _ in range(requests_count):
+            start = time.perf_counter()
+            requests.post(f"{base_url}/keypress/Lit_a", timeout=roku.timeout)
+            latencies.append(time.perf_counter() - start)
+        results["keypress_unpooled"] = latency_report("keypress (new connection each)", latencies)
+        latencies = []
+        for _ in range(requests_count):
+            start = time.perf_counter()
+            roku.send_keypress("Lit_a")
+            latencies.append(time.perf_counter() - start)
+        results["keypress_pooled"] = latency_report("keypress (pooled keep-alive)", latencies)
+        start = time.perf_counter()
+        launches = max(1, requests_count // 4)
+        for _ in range(launches):
+            roku.launch_app("12")
+        results["launches_per_second"] = launches / (time.perf_counter() - start)
+        print(f"launch: {results['launches_per_second']:.1f} launches/sec")
+        text = "the quick brown fox jumps over"
+        start = time.perf_counter()
+        roku.send_text(text, pipeline_depth=1)
+        results["text_sequential"] = time.perf_counter() - start
+        start = time.perf_counter()
+        roku.send_text(text)
+        results["text_pipelined"] = time.perf_counter() - start
+        print(f"text entry ({len(text)} chars): {results['text_sequential'] * 1000:.1f} ms one request at a time, {results['text_pipelined'] * 1000:.1f} ms pipelined")
+        if mock:
+            start = time.perf_counter()
+            found = []
+            discover_devices(timeout=1.0, address=(mock.host, mock.ssdp_port), callback=lambda device: found.append(time.perf_counter() - start))
+            results["discovery_first_response"] = found[0] if found else None
+            if found:
+                print(f"discovery: first device after {found[0] * 1000:.2f} ms")
+            else:
+                print("discovery: no response")
+    finally:
+        if proxy:
+            proxy.stop()
+        if mock:
+            mock.stop()
+    results["history"] = benchmark_history(requests_count * 10)
+    return results
+def benchmark_history(count=2000):
+    directory = tempfile.mkdtemp(prefix="roku_history_bench_")
+    results = {}
+    try:
+        for name in ("command_history.jsonl", "command_history.db"):
+            history = CommandHistory(os.path.join(directory, name))
+            start = time.perf_counter()
+            for i in range(count):
+                history.add_item(("Send Key", "Launch App", "Send Text")[i % 3], "Failed" if i % 17 == 0 else "Success", f"Sent key {i}", latency=(i % 300) / 1000)
+            added = time.perf_counter() - start
+            history.save_history()
+            flushed = time.perf_counter() - start
+            history.query(1)
+            start = time.perf_counter()
+            history.query(200, action="Launch App", status="Failed")
+            queried = time.perf_counter() - start
+            start = time.perf_counter()
+            history.summary()
+            summarized = time.perf_counter() - start
+            history.close()
+            results[name] = {"add": added / count, "flush": flushed, "query": queried, "summary": summarized}
+            print(f"history write ({os.path.splitext(name)[1]}): {added / count * 1e6:.1f} us per add, {flushed * 1000:.1f} ms until {count} items were on disk")
+            print(f"history query ({os.path.splitext(name)[1]}): {queried * 1000:.2f} ms filtered query, {summarized * 1000:.1f} ms summary over {count} items")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+def benchmark_hold(hold=1.5, delays=(0.0, 0.05, 0.2, 0.5)):
+    results = {}
+    for delay in delays:
+        mock = MockRokuServer(port=0, delay=delay)
+        mock.start()
+        try:
+            roku = RokuController("127.0.0.1", port=mock.port, fetch_info=False)
+            dispatcher = KeyDispatcher(roku)
+            dispatcher.submit("Home")
+            time.sleep(delay * 2 + 0.05)
+            mock.keys.clear()
+            stats = {}
+            dispatcher.hold_callback = lambda key, ok, result, token: stats.update(result, done=time.perf_counter())
+            dispatcher.hold("Down")
+            time.sleep(hold)
+            dispatcher.release()
+            released = time.perf_counter()
+            while "done" not in stats:
+                time.sleep(0.005)
+            time.sleep(delay + 0.05)
+            late = len(mock.keys) - stats["count"]
+            dispatcher.stop()
+        finally:
+            mock.stop()
+        results[delay] = dict(stats, late=late)
+        print(f"hold ({delay * 1000:.0f} ms device delay): {stats['count']} presses in {hold:.1f}s, "
+              f"{stats['interval'] * 1000:.0f} ms interval, rtt {stats['rtt'] * 1000:.0f} ms, "
+              f"overshoot {stats['overshoot'] + max(late, 0)}, stopped {(stats['done'] - released) * 1000:.0f} ms after release")
+    return results
+def benchmark_soak(count=200000, capacity=1000, threads=4, rounds=10):
+    import tracemalloc
+    directory = tempfile.mkdtemp(prefix="roku_soak_bench_")
+    history = CommandHistory(os.path.join(directory, "command_history.jsonl"), max_items=capacity)
+    pairs = max(1, count // (2 * threads * rounds))
+    samples = []
+    def worker(name):
+        for i in range(pairs):
+            ref = history.add_item("Send Key", "Started", f"Sending Down {name}-{i}")
+            history.add_item("Send Key", "Success" if i % 50 else "Failed", f"Sent Down {name}-{i}", ref, 0.02)
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        for round_number in range(rounds):
+            workers = [threading.Thread(target=worker, args=(f"{round_number}.{n}",)) for n in range(threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            history.save_history()
+            samples.append(tracemalloc.get_traced_memory()[0])
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        records = history.items.range(history.items.first_id, history.items.next_id)
+        broken = sum(1 for record in records if record.ref is not None and history.items.get(record.ref) is not None and history.items.get(record.ref).op_id != record.op_id)
+    finally:
+        tracemalloc.stop()
+        history.close()
+        shutil.rmtree(directory, ignore_errors=True)
+    total = pairs * 2 * threads * rounds
+    print(f"history soak: {total:,} records from {threads} threads in {elapsed:.1f}s, {len(records)} kept in memory, ids {records[0].id}-{records[-1].id}, {broken} mislinked")
+    print(f"traced memory by round (KB): {' '.join(f'{sample / 1024:.0f}' for sample in samples)}; peak {peak / 1024:.0f} KB")
+    print(f"growth after the first round: {(samples[-1] - samples[0]) / 1024:+.0f} KB")
+    return {"records": total, "memory": samples, "peak": peak, "mislinked": broken}
+def benchmark_voice(count=20000, app_count=150):
+    matcher = VoiceCommandMatcher()
+    app_list = [AppInfo(app_id, name) for app_id, name in MockRokuServer.SAMPLE_APPS]
+    app_list += [AppInfo(str(100000 + i), f"Channel {i}") for i in range(app_count - len(app_list))]
+    utterances = ["down five", "volume up 3", "pause", "rewind", "go back", "open netflix", "launch channel 42", "open disnee plus", "turn it down", "something else"]
+    start = time.perf_counter()
+    for i in range(count):
+        matcher.match(utterances[i % len(utterances)], app_list)
+    elapsed = time.perf_counter() - start
+    print(f"voice matcher: {count / elapsed:,.0f} matches/sec with {len(app_list)} apps")
+    return count / elapsed
+def benchmark_parse(runs=200, app_count=500):
+    import tracemalloc
+    mock = MockRokuServer(port=0, app_count=app_count)
+    mock.server.server_close()
+    payloads = {"apps": mock.apps_xml(), "device-info": mock.device_info_xml()}
+    def legacy_apps(data):
+        return [(app.get('id'), app.text) for app in ET.fromstring(data.decode('utf-8')).findall('.//app')]
+    def legacy_apps_with_attributes(data):
+        return [dict(app.attrib, name=app.text) for app in ET.fromstring(data.decode('utf-8')).findall('.//app')]
+    def legacy_device_info(data):
+        return {child.tag: child.text for child in ET.fromstring(data.decode('utf-8'))}
+    def cold_app_list(data):
+        APP_LIST_CACHE.clear()
+        return parse_app_list(data)
+    def unchanged_app_list(data):
+        return parse_app_list(bytes(bytearray(data)))
+    cases = [
+        ("apps", "legacy", legacy_apps),
+        ("apps", "dicts", legacy_apps_with_attributes),
+        ("apps", "records", cold_app_list),
+        ("apps", "unchanged", unchanged_app_list),
+        ("device-info", "legacy", legacy_device_info),
+        ("device-info", "records", parse_device_info)
+    ]
+    results = {}
+    for document, path, parse in cases:
+        data = payloads[document]
+        parse(data)
+        timings = []
+        for _ in range(max(1, runs)):
+            start = time.perf_counter()
+            for _ in range(3):
+                parse(data)
+            timings.append((time.perf_counter() - start) / 3)
+        elapsed = min(timings)
+        tracemalloc.start()
+        records = [parse(data) for _ in range(10)]
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del records
+        results[(document, path)] = elapsed
+        print(f"{document:12} {path:10} {elapsed * 1e6:9.1f} us/parse  {len(data) / elapsed / 1e6:6.1f} MB/s  "
+              f"peak {peak / 1024:7.1f} KiB  retained {retained / 10 / 1024:6.1f} KiB/result")
+    return results
+def benchmark_ui(count=1000, workers=4):
+    try:
+        load_gui_modules()
+        root = tk.Tk()
+    except Exception as e:
+        print(f"ui benchmark needs a display: {e}")
+        return None
+    root.withdraw()
+    results = {}
+    for mode in ("after", "bus"):
+        labels = [tk.StringVar(root) for _ in range(10)]
+        log = []
+        bus = UIUpdateBus(root) if mode == "bus" else None
+        gaps = []
+        state = {"last": time.perf_counter(), "finished": 0, "sets": 0, "end": None}
+        expected_calls = (count + 9) // 10
+        def set_label(var, value):
+            var.set(value)
+            state["sets"] += 1
+        def frame():
+            now = time.perf_counter()
+            gaps.append(now - state["last"])
+            state["last"] = now
+            if state["end"] is None:
+                root.after(16, frame)
+        def worker(offset):
+            for i in range(offset, count, workers):
+                var = labels[i % len(labels)]
+                if i % 10 == 0:
+                    bus.call(log.append, i) if bus else root.after(0, log.append, i)
+                elif bus:
+                    bus.set(var, i)
                 else:
-                    self.root.after(0, lambda: self.status_var.set(f"App not recognized in voice command: '{command}'"))
-                    self.root.after(0, lambda: self.history.add_item("Voice Command", "Failed", f"App not recognized: '{command}'"))
-            return
-        if "up" in command:
-            self.root.after(0, lambda: self.send_key("Up"))
-        elif "down" in command:
-            self.root.after(0, lambda: self.send_key("Down"))
-        elif "left" in command:
-            self.root.after(0, lambda: self.send_key("Left"))
-        elif "right" in command:
-            self.root.after(0, lambda: self.send_key("Right"))
-        elif "select" in command or "enter" in command or "ok" in command:
-            self.root.after(0, lambda: self.send_key("Select"))
-        elif "back" in command or "return" in command:
-            self.root.after(0, lambda: self.send_key("Back"))
-        elif "home" in command or "menu" in command:
-            self.root.after(0, lambda: self.send_key("Home"))
-        elif "play" in command or "resume" in command:
-            self.root.after(0, lambda: self.send_key("Play"))
-        elif "pause" in command:
-            self.root.after(0, lambda: self.send_key("Play"))
-        elif "forward" in command or "skip" in command:
-            self.root.after(0, lambda: self.send_key("Fwd"))
-        elif "rewind" in command or "back" in command:
-            self.root.after(0, lambda: self.send_key("Rev"))
-        elif "volume up" in command or "louder" in command:
-            self.root.after(0, lambda: self.send_key("VolumeUp"))
-        elif "volume down" in command or "quieter" in command:
-            self.root.after(0, lambda: self.send_key("VolumeDown"))
-        elif "mute" in command:
-            self.root.after(0, lambda: self.send_key("VolumeMute"))
-        elif "power" in command or "turn off" in command or "shutdown" in command:
-            self.root.after(0, lambda: self.send_key("Power"))
+                    root.after(0, set_label, var, i)
+            state["finished"] += 1
+        def check():
+            drained = bus.pending() == 0 if bus else state["sets"] == count - expected_calls
+            if state["finished"] == workers and drained and len(log) == expected_calls:
+                state["end"] = time.perf_counter()
+                root.quit()
+            else:
+                root.after(2, check)
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(offset,), daemon=True) for offset in range(workers)]
+        root.after(16, frame)
+        root.after(0, lambda: [thread.start() for thread in threads])
+        root.after(2, check)
+        root.mainloop()
+        if bus:
+            bus.stop()
+        lateness = [max(0.0, gap - 0.016) for gap in gaps[1:]] or [0.0]
+        callbacks = bus.applied if bus else count
+        results[mode] = state["end"] - start
+        print(f"{mode:5}  {count} updates drained in {(state['end'] - start) * 1000:7.1f} ms  "
+              f"{callbacks:5} Tk callbacks  frame lateness p50 {percentile(lateness, 50) * 1000:5.1f} ms  "
+              f"p95 {percentile(lateness, 95) * 1000:5.1f} ms  max {max(lateness) * 1000:5.1f} ms")
+    root.destroy()
+    return results
+def profile_gui_startup():
+    profiler = StartupProfiler()
+    with profiler.phase("tk"):
+        load_gui_modules()
+        root = tk.Tk()
+    def ready():
+        if app.voice_prewarm:
+            app.voice_prewarm.join()
+        print(json.dumps(profiler.to_dict()))
+        app.on_close()
+    app = RokuGUI(root, profiler, on_ready=ready)
+    root.mainloop()
+def benchmark_gui_startup(runs=5, history_items=1000):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    directory = tempfile.mkdtemp(prefix="roku_startup_bench_")
+    samples = {}
+    try:
+        history = CommandHistory(os.path.join(directory, "command_history.jsonl"))
+        for i in range(history_items):
+            history.add_item("Send Key", "Success", f"Sent key {i}", latency=0.05)
+        history.close()
+        code = f"import sys; sys.path.insert(0, {script_dir!r}); import main; main.profile_gui_startup()"
+        for _ in range(runs):
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, "-c", code], cwd=directory, capture_output=True, timeout=60)
+            elapsed = time.perf_counter() - start
+            if completed.returncode != 0:
+                print(f"GUI cold start: failed ({completed.stderr.decode().strip().splitlines()[-1]})")
+                return {}
+            profile = json.loads(completed.stdout.decode().strip().splitlines()[-1])
+            for name, value in profile["phases"].items():
+                samples.setdefault(name, []).append(value)
+            for name, value in profile["marks"].items():
+                samples.setdefault(f"until {name}", []).append(value)
+            samples.setdefault("process total", []).append(elapsed)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    results = {}
+    print(f"GUI cold start with {history_items} history items, median over {runs} runs:")
+    for name, values in samples.items():
+        values.sort()
+        results[name] = values[len(values) // 2]
+        print(f"  {name:<20} {results[name] * 1000:8.1f} ms")
+    return results
+def benchmark_startup(runs=5):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    cases = [
+        ("headless import", "import main"),
+        ("eager GUI + voice imports", "import main; main.load_gui_modules(); main.load_voice_modules()")
+    ]
+    results = {}
+    for name, code in cases:
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, "-c", code], cwd=script_dir, capture_output=True)
+            timings.append(time.perf_counter() - start)
+            if completed.returncode != 0:
+                print(f"{name}: failed ({completed.stderr.decode().strip().splitlines()[-1]})")
+                break
+        else:
+            timings.sort()
+            results[name] = timings[len(timings) // 2]
+            print(f"{name}: {results[name] * 1000:.1f} ms median over {runs} runs")
+    results["gui"] = benchmark_gui_startup(runs)
+    return results
+def build_parser():
+    parser = argparse.ArgumentParser(description="Control Roku devices over ECP")
+    parser.add_argument("--ip", help="Roku IP address, optionally as IP:PORT (defaults to the last known or discovered device)")
+    parser.add_argument("--port", dest="ecp_port", type=int, default=None, metavar="PORT", help=f"Roku ECP port (default {ECP_PORT})")
+    parser.add_argument("--group", help="Send the command to every device in a fleet group")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum devices contacted at once with --group")
+    parser.add_argument("--metrics", nargs="?", const="-", help="Write timing metrics in Prometheus text format to a file (or stdout) after the command")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("gui", help="Start the graphical remote (default)")
+    key_parser = subparsers.add_parser("key", help="Send one or more keypresses")
+    key_parser.add_argument("keys", nargs="+")
+    key_parser.add_argument("--hold", type=float, default=0.0, help="Hold each key for this many seconds, repeating at a rate matched to the TV's response time")
+    launch_parser = subparsers.add_parser("launch", help="Launch an app by ID")
+    launch_parser.add_argument("app_id")
+    text_parser = subparsers.add_parser("text", help="Type text into the focused field")
+    text_parser.add_argument("text")
+    text_parser.add_argument("--pace", type=float, default=0.0, help="Seconds to wait between characters")
+    subparsers.add_parser("apps", help="List installed apps")
+    subparsers.add_parser("info", help="Show device information")
+    discover_parser = subparsers.add_parser("discover", help="Find Roku devices on the network")
+    discover_parser.add_argument("--timeout", type=float, default=None)
+    discover_parser.add_argument("--scan", action="store_true", help="Scan the local subnet for port 8060 instead of using SSDP")
+    discover_parser.add_argument("--subnet", action="append", help="Subnet to scan in CIDR form (repeatable, defaults to the local /24)")
+    discover_parser.add_argument("--port", type=int, default=ECP_PORT, help="ECP port to scan for")
+    daemon_parser = subparsers.add_parser("daemon", help="Serve a local HTTP API for one Roku")
+    daemon_parser.add_argument("--host", default="127.0.0.1")
+    daemon_parser.add_argument("--port", type=int, default=8061)
+    fleet_parser = subparsers.add_parser("fleet", help="Manage fleet groups")
+    fleet_parser.add_argument("action", choices=["list", "set", "delete"])
+    fleet_parser.add_argument("name", nargs="?")
+    fleet_parser.add_argument("ips", nargs="*")
+    subparsers.add_parser("wake", help="Send Wake-on-LAN to a known device")
+    macro_parser = subparsers.add_parser("macro", help="Manage and play macros")
+    macro_parser.add_argument("action", choices=["list", "play", "from-history", "delete", "schedule", "scheduler"])
+    macro_parser.add_argument("name", nargs="?")
+    macro_parser.add_argument("--at", help="Daily run time (HH:MM) for schedule")
+    macro_parser.add_argument("--last", type=int, default=20, help="History entries to convert with from-history")
+    macro_parser.add_argument("--realtime", action="store_true", help="Keep the recorded delays between steps")
+    history_parser = subparsers.add_parser("history", help="Search command history")
+    history_parser.add_argument("filter", nargs="*", help="Words to search for and action:, status:, device:, since:, until: filters")
+    history_parser.add_argument("--limit", type=int, default=50)
+    history_parser.add_argument("--summary", action="store_true", help="Show counts, failure rates and latency percentiles per action")
+    bench_parser = subparsers.add_parser("bench", help="Run benchmarks")
+    bench_parser.add_argument("suite", choices=["startup", "ecp", "history", "voice", "parse", "ui", "hold", "soak"])
+    bench_parser.add_argument("--runs", type=int, default=5)
+    bench_parser.add_argument("--requests", type=int, default=200)
+    bench_parser.add_argument("--delay", type=float, default=0.0, help="Mock response delay in seconds")
+    bench_parser.add_argument("--rtt", type=float, default=0.0, help="Network round-trip time in seconds to add between the client and the mock")
+    bench_parser.add_argument("--jitter", type=float, default=0.0, help="Mock response jitter in seconds")
+    bench_parser.add_argument("--failure-rate", type=float, default=0.0, help="Mock failure probability")
+    mock_parser = subparsers.add_parser("mock", help="Run a local mock Roku ECP server")
+    mock_parser.add_argument("--host", default="127.0.0.1")
+    mock_parser.add_argument("--port", type=int, default=ECP_PORT)
+    mock_parser.add_argument("--ssdp-port", type=int, default=None)
+    mock_parser.add_argument("--delay", type=float, default=0.0)
+    mock_parser.add_argument("--jitter", type=float, default=0.0)
+    mock_parser.add_argument("--failure-rate", type=float, default=0.0)
+    mock_parser.add_argument("--apps", type=int, default=5)
+    return parser
+def connect_cli(ip_address, fetch_info=True, port=ECP_PORT):
+    roku = RokuController(ip_address, registry=DeviceRegistry(), fetch_info=fetch_info, port=port, cache_first=False)
+    if not roku.ip_address or not roku.connected:
+        print("Could not connect to a Roku device")
+        return None
+    if roku.from_cache:
+        print(f"Roku at {roku.ip_address} is not responding; showing cached data", file=sys.stderr)
+    return roku
+def run_cli(args):
+    if args.command == "discover":
+        def show(device):
+            print(f"{device.ip_address}\t{device.serial_number or ''}\t{device.server or ''}")
+        devices = [] if args.scan else discover_devices(args.timeout, callback=show)
+        if not devices:
+            devices = scan_devices(args.subnet, args.port, callback=show, progress=lambda done, total: print(f"\r{done}/{total} addresses scanned", end="\n" if done == total else "", file=sys.stderr, flush=True))
+        return 0 if devices else 1
+    if args.command == "bench":
+        if args.suite == "startup":
+            benchmark_startup(args.runs)
+        elif args.suite == "ecp":
+            benchmark_ecp(args.ip, args.ecp_port, requests_count=args.requests, delay=args.delay, jitter=args.jitter, failure_rate=args.failure_rate, rtt=args.rtt)
+        elif args.suite == "history":
+            benchmark_history(args.requests * 10)
+        elif args.suite == "voice":
+            benchmark_voice(args.requests * 100)
+        elif args.suite == "parse":
+            benchmark_parse(args.runs * 40)
+        elif args.suite == "ui":
+            benchmark_ui(args.requests * 5)
+        elif args.suite == "hold":
+            benchmark_hold()
+        elif args.suite == "soak":
+            benchmark_soak(args.requests * 1000)
+        return 0
+    if args.command == "mock":
+        MockRokuServer(args.host, args.port, args.delay, args.jitter, args.failure_rate, args.apps, args.ssdp_port).serve_forever()
+        return 0
+    if args.command == "fleet":
+        return run_fleet_command(args)
+    if args.command == "macro" and args.action != "play":
+        return run_macro_command(args)
+    if args.command == "wake":
+        return run_wake(args)
+    if args.command == "history":
+        return run_history_command(args)
+    if args.group:
+        return run_fleet_broadcast(args)
+    roku = connect_cli(args.ip, fetch_info=args.command in ("apps", "info"), port=args.ecp_port)
+    if roku is None:
+        return 1
+    if args.command == "key" and args.hold:
+        ok = all([hold_key(roku, key, args.hold) for key in args.keys])
+    elif args.command == "key":
+        ok = all([roku.send_keypress(key) for key in args.keys])
+    elif args.command == "launch":
+        ok = roku.launch_app(args.app_id)
+    elif args.command == "text":
+        ok = roku.send_text(args.text, pace=args.pace) == len(args.text)
+    elif args.command == "apps":
+        for app in roku.app_list:
+            print(f"{app.id}\t{app.name}\t{app.version or ''}")
+        ok = bool(roku.app_list)
+    elif args.command == "info":
+        print(json.dumps(roku.device_info.to_dict(), indent=2))
+        ok = bool(roku.device_info)
+    elif args.command == "daemon":
+        RokuDaemon(roku, args.host, args.port).serve_forever()
+        ok = True
+    elif args.command == "macro":
+        macro = MacroStore().get(args.name)
+        if macro is None:
+            print(f"Macro '{args.name}' not found")
+            return 1
+        result = MacroPlayer(roku).play(macro, args.realtime)
+        print(macro_report(macro, result))
+        ok = result["ok"]
+    return 0 if ok else 1
+def hold_key(roku, key, seconds):
+    results = queue.Queue()
+    dispatcher = KeyDispatcher(roku, hold_callback=lambda key, ok, stats, token: results.put((ok, stats)))
+    try:
+        dispatcher.hold(key)
+        time.sleep(seconds)
+        dispatcher.release()
+        ok, stats = results.get()
+    finally:
+        dispatcher.stop()
+    print(f"{key}: {stats['count']} press(es) in {stats['duration']:.2f}s, {stats['rtt'] * 1000:.0f} ms round trip, {stats['interval'] * 1000:.0f} ms repeat interval, {stats['overshoot']} after release")
+    return ok
+def run_fleet_command(args):
+    groups = FleetGroups()
+    if args.action == "list":
+        for name in groups.names():
+            print(f"{name}: {' '.join(groups.get(name))}")
+    elif not args.name:
+        print("A group name is required")
+        return 1
+    elif args.action == "set":
+        groups.set_group(args.name, args.ips)
+    elif args.action == "delete":
+        groups.delete_group(args.name)
+    return 0
+def run_wake(args):
+    registry = DeviceRegistry()
+    ip_addresses = FleetGroups().get(args.group) if args.group else [args.ip] if args.ip else [None]
+    failed = 0
+    for ip in ip_addresses:
+        entry = registry.find_by_ip(*split_host_port(ip, args.ecp_port)) if ip else registry.most_recent()
+        if not entry:
+            print(f"No saved device info for {ip or 'any device'}; connect once while the TV is on")
+            failed += 1
+            continue
+        roku = RokuController(entry["ip_address"], fetch_info=False, port=entry.get("port", ECP_PORT))
+        roku.device_info = DeviceInfo.from_dict(entry.get("device_info", {}))
+        if roku.wake():
+            print(f"Woke {roku.ip_address} ({roku.wake_mac()})")
+        else:
+            failed += 1
+    return 1 if failed else 0
+def run_history_command(args):
+    try:
+        filters = parse_history_filter(shlex.join(args.filter))
+    except ValueError as e:
+        print(f"Invalid history filter: {e}")
+        return 1
+    history = CommandHistory()
+    try:
+        if args.summary:
+            for action, stats in history.summary(**filters).items():
+                latencies = " ".join(f"{key}={stats[key]:.0f}ms" for key in ("p50", "p90", "p99") if stats[key] is not None)
+                print(f"{action}\t{stats['count']} command(s)\t{stats['failure_rate'] * 100:.1f}% failed\t{latencies}")
         else:
-            self.root.after(0, lambda: self.status_var.set(f"Unrecognized voice command: '{command}'"))
-            self.root.after(0, lambda: self.history.add_item("Voice Command", "Unrecognized", f"'{command}'"))
-            self.root.after(0, self.refresh_history)
-def main():
-    root = tk.Tk()
-    app = RokuGUI(root)
+            for item in history.query(args.limit, **filters):
+                print(f"{item.get('timestamp', '')}\t{item.get('action', '')}\t{item.get('status', '')}\t{format_latency(item)}\t{item.get('details', '')}")
+    finally:
+        history.close()
+    return 0
+def run_macro_command(args):
+    store = MacroStore()
+    if args.action == "list":
+        for name in store.names():
+            print(f"{name}: {len(store.get(name).steps)} step(s)")
+        for entry in store.schedules:
+            print(f"  {entry['macro']} daily at {entry['at']} on {entry.get('group') or ' '.join(entry['ip_addresses'])}")
+        return 0
+    if not args.name and args.action != "scheduler":
+        print("A macro name is required")
+        return 1
+    if args.action == "from-history":
+        history = CommandHistory()
+        macro = Macro.from_history(args.name, history.items.tail(args.last))
+        history.close()
+        store.save_macro(macro)
+        print(f"Saved macro {macro.name} with {len(macro.steps)} step(s)")
+    elif args.action == "delete":
+        store.delete_macro(args.name)
+    elif args.action == "schedule":
+        if store.get(args.name) is None or not args.at:
+            print("schedule needs an existing macro and --at HH:MM")
+            return 1
+        if args.group:
+            store.add_schedule(args.name, args.at, group=args.group, realtime=args.realtime)
+        elif args.ip:
+            store.add_schedule(args.name, args.at, [join_host_port(args.ip, args.ecp_port)], realtime=args.realtime)
+        else:
+            print("schedule needs --ip or --group")
+            return 1
+    elif args.action == "scheduler":
+        scheduler = MacroScheduler(store)
+        scheduler.start()
+        print(f"Running {len(store.schedules)} scheduled macro(s); press Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
+    return 0
+def run_fleet_broadcast(args):
+    ip_addresses = FleetGroups().get(args.group)
+    if not ip_addresses:
+        print(f"Fleet group '{args.group}' is empty or does not exist")
+        return 1
+    fleet = FleetController(ip_addresses, max_workers=args.concurrency)
+    if args.command == "key":
+        results = [fleet.send_keypress(key) for key in args.keys]
+    elif args.command == "launch":
+        results = [fleet.launch_app(args.app_id)]
+    elif args.command == "info":
+        results = [fleet.get_device_info()]
+    elif args.command == "apps":
+        results = [fleet.get_app_list()]
+    elif args.command == "macro":
+        macro = MacroStore().get(args.name)
+        if macro is None:
+            print(f"Macro '{args.name}' not found")
+            return 1
+        results = [fleet.run(f"macro {macro.name}", lambda roku: MacroPlayer(roku).play(macro, args.realtime), result_of=lambda value: value and value["ok"], timeout=600)]
+    else:
+        print(f"'{args.command}' cannot be sent to a fleet group")
+        return 1
+    fleet.close()
+    for result in results:
+        for ip, device_result in sorted(result.results.items()):
+            status = "ok" if device_result["ok"] else f"failed ({device_result['error'] or 'no response'})"
+            line = f"{ip}\t{status}\t{device_result['latency'] * 1000:.0f} ms\t{device_result['attempts']} attempt(s)"
+            if args.command in ("info", "apps") and device_result["ok"]:
+                line += "\t" + json.dumps(device_result["value"])
+            print(line)
+        print(result.summary())
+    return 0 if all(not result.failed for result in results) else 1
+def run_gui(ip_address=None):
+    profiler = StartupProfiler()
+    with profiler.phase("tk"):
+        load_gui_modules()
+        root = tk.Tk()
+    app = RokuGUI(root, profiler)
+    if ip_address:
+        app.ip_var.set(ip_address)
     root.mainloop()
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        args.ip, args.ecp_port = split_host_port(args.ip, args.ecp_port)
+    except ValueError:
+        parser.error(f"invalid --ip address: {args.ip}")
+    if args.command in (None, "gui"):
+        run_gui(args.ip and join_host_port(args.ip, args.ecp_port))
+        return 0
+    try:
+        return run_cli(args)
+    finally:
+        if args.metrics == "-":
+            sys.stdout.write(METRICS.to_prometheus())
+        elif args.metrics:
+            with open(args.metrics, "w") as f:
+                f.write(METRICS.to_prometheus())
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
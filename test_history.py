@@ -0,0 +1,83 @@
+import os
+import pytest
+from main import open_history_store, CommandHistory
+def record(n, action="Send Key", status="Success", latency=10.0):
+    return {"ts": 1000.0 + n, "action": action, "status": status, "details": f"item {n}", "latency_ms": latency}
+@pytest.fixture(params=["history.jsonl", "history.db"])
+def path(request, tmp_path):
+    return str(tmp_path / request.param)
+def fill(store, items):
+    for item in items:
+        store.append(item)
+    store.flush()
+def details(items):
+    return [item["details"] for item in items]
+def test_query_filters_oldest_first(path):
+    store = open_history_store(path, flush_interval=0.01)
+    fill(store, [record(0, "Launch App"), record(1), record(2, "Launch App", "Failed"), record(3, "Launch App"), record(4)])
+    assert details(store.query(action="Launch App")) == ["item 0", "item 2", "item 3"]
+    assert details(store.query(action="launch app", status="Success")) == ["item 0", "item 3"]
+    assert details(store.query(limit=1, action="Send Key")) == ["item 4"]
+    assert details(store.query(search="item 1")) == ["item 1"]
+    assert store.query(action="Power") == []
+    store.close()
+def test_summary_skips_started_rows(path):
+    store = open_history_store(path, flush_interval=0.01)
+    fill(store, [record(0, status="Started", latency=None), record(1, latency=10.0), record(2, status="Failed", latency=30.0), record(3, "Launch App", latency=None)])
+    summary = store.summary()
+    assert summary["Send Key"]["count"] == 2
+    assert summary["Send Key"]["failures"] == 1
+    assert summary["Send Key"]["failure_rate"] == 0.5
+    assert summary["Send Key"]["p50"] == 20.0
+    assert summary["Launch App"]["p50"] is None
+    assert list(store.summary(action="Launch App")) == ["Launch App"]
+    store.close()
+def test_reopen_and_clear(path):
+    store = open_history_store(path, flush_interval=0.01)
+    fill(store, [record(n) for n in range(5)])
+    store.close()
+    store = open_history_store(path, flush_interval=0.01)
+    assert details(store.load_tail(2)) == ["item 3", "item 4"]
+    assert len(list(store.iter_items())) == 5
+    store.clear()
+    store.flush()
+    assert store.is_empty()
+    assert store.query() == []
+    store.close()
+def test_jsonl_recovers_from_torn_write(tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    store = open_history_store(path, flush_interval=0.01)
+    fill(store, [record(0), record(1)])
+    store.close()
+    with open(path, "a") as f:
+        f.write('{"action": "Send Ke')
+    store = open_history_store(path, flush_interval=0.01)
+    fill(store, [record(2)])
+    assert details(store.query()) == ["item 0", "item 1", "item 2"]
+    store.close()
+def test_jsonl_rotation_keeps_backups(tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    store = open_history_store(path, flush_interval=0.01, max_bytes=200, backups=2)
+    for n in range(20):
+        fill(store, [record(n)])
+    assert store.files() == [path + ".2", path + ".1", path]
+    assert not os.path.exists(path + ".3")
+    items = store.query()
+    assert details(items)[-1] == "item 19"
+    assert [item["ts"] for item in items] == sorted(item["ts"] for item in items)
+    store.close()
+def test_sqlite_max_rows(tmp_path):
+    store = open_history_store(str(tmp_path / "history.db"), flush_interval=0.01, max_rows=3)
+    for n in range(6):
+        fill(store, [record(n)])
+    assert details(store.query()) == ["item 3", "item 4", "item 5"]
+    store.close()
+def test_command_history_queries_beyond_ring(path):
+    history = CommandHistory(path, store=open_history_store(path, flush_interval=0.01), max_items=3)
+    for n in range(5):
+        ref = history.add_item("Launch App", "Started", f"Launching {n}")
+        history.add_item("Launch App", "Success", f"Launched {n}", ref, latency=0.01)
+    assert len(history.items) == 3
+    assert len(history.query(None, action="Launch App", status="Success")) == 5
+    assert history.summary()["Launch App"]["count"] == 5
+    history.close()
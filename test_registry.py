@@ -0,0 +1,62 @@
+import json
+import os
+import threading
+from types import SimpleNamespace
+import pytest
+from main import DeviceRegistry, DeviceInfo, RokuDevice, split_host_port, join_host_port, ECP_PORT
+def fake_roku(serial, ip_address, port=ECP_PORT):
+    info = DeviceInfo()
+    info.serial_number = serial
+    return SimpleNamespace(ip_address=ip_address, port=port, device_info=info, app_list=[])
+def test_split_host_port():
+    assert split_host_port("10.0.0.5") == ("10.0.0.5", ECP_PORT)
+    assert split_host_port("10.0.0.5:8061") == ("10.0.0.5", 8061)
+    assert split_host_port("10.0.0.5", 9000) == ("10.0.0.5", 9000)
+    assert split_host_port("10.0.0.5:8061", 9000) == ("10.0.0.5", 8061)
+    with pytest.raises(ValueError):
+        split_host_port("10.0.0.5:http")
+def test_join_host_port_round_trip():
+    assert join_host_port("10.0.0.5", ECP_PORT) == "10.0.0.5"
+    assert join_host_port("10.0.0.5", 8061) == "10.0.0.5:8061"
+    for address in ("10.0.0.5", "10.0.0.5:8061"):
+        assert join_host_port(*split_host_port(address)) == address
+def test_devices_on_one_host_keyed_by_port(tmp_path):
+    registry = DeviceRegistry(str(tmp_path / "registry.json"))
+    registry.remember(fake_roku("A", "127.0.0.1"))
+    registry.remember(fake_roku("B", "127.0.0.1", 8061))
+    assert set(registry.devices) == {"A", "B"}
+    assert registry.find_by_ip("127.0.0.1")["port"] == ECP_PORT
+    assert registry.find_by_ip("127.0.0.1", 8061) is registry.get("B")
+    assert registry.find_by_ip("127.0.0.1", 8062) is None
+def test_new_serial_replaces_same_address(tmp_path):
+    registry = DeviceRegistry(str(tmp_path / "registry.json"))
+    registry.remember(fake_roku("A", "10.0.0.5"))
+    registry.remember(fake_roku("B", "10.0.0.5"))
+    assert list(registry.devices) == ["B"]
+def test_saved_registry_reloads(tmp_path):
+    path = str(tmp_path / "registry.json")
+    registry = DeviceRegistry(path)
+    registry.remember(fake_roku("A", "10.0.0.5", 8061))
+    reloaded = DeviceRegistry(path)
+    assert reloaded.get("A")["port"] == 8061
+    devices = reloaded.known_devices()
+    assert [(device.ip_address, device.port, device.serial_number) for device in devices] == [("10.0.0.5", 8061, "A")]
+    assert os.listdir(tmp_path) == ["registry.json"]
+def test_update_location(tmp_path):
+    registry = DeviceRegistry(str(tmp_path / "registry.json"))
+    registry.remember(fake_roku("A", "10.0.0.5"))
+    assert not registry.update_location(RokuDevice("10.0.0.5", serial_number="A"))
+    assert registry.update_location(RokuDevice("10.0.0.5", location="http://10.0.0.5:8061/", serial_number="A"))
+    assert DeviceRegistry.address(registry.get("A")) == "10.0.0.5:8061"
+    assert not registry.update_location(RokuDevice("10.0.0.9", serial_number="unknown"))
+def test_concurrent_saves_leave_valid_file(tmp_path):
+    path = str(tmp_path / "registry.json")
+    registry = DeviceRegistry(path)
+    threads = [threading.Thread(target=registry.remember, args=(fake_roku(f"S{n}", f"10.0.0.{n}"),)) for n in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(path) as f:
+        assert len(json.load(f)) == 20
+    assert os.listdir(tmp_path) == ["registry.json"]
@@ -0,0 +1,11 @@
+from main import VoiceCommandMatcher
+def key_intent(text):
+    intent = VoiceCommandMatcher().match(text)
+    return intent.kind, intent.value, intent.count
+def test_filler_words_are_not_counts():
+    assert key_intent("turn it down for me") == ("key", "VolumeDown", 1)
+    assert key_intent("scroll down to the bottom") == ("key", "Down", 1)
+def test_trailing_count():
+    assert key_intent("volume up five") == ("key", "VolumeUp", 5)
+    assert key_intent("down 3 times") == ("key", "Down", 3)
+    assert key_intent("go up two please") == ("key", "Up", 1)